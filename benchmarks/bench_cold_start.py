@@ -0,0 +1,85 @@
+"""Cold start and first request latency of a fresh process, like a new app replica.
+
+Each scenario runs in its own Python process, with a compiled lexicon on local disk,
+and the first request is an offline analysis of a synthetic corpus.
+
+Usage:
+    python -m benchmarks.bench_cold_start              # 3 runs per scenario
+    python -m benchmarks.bench_cold_start --runs 5 --docs 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+import sentiment
+from tests.helpers import frozen_lexicon
+
+ROOT = Path(__file__).resolve().parents[1]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import sentiment
+seconds = {{"import": time.perf_counter() - start}}
+from tests.helpers import StubClient, make_corpus
+if {eager}:
+    start = time.perf_counter()
+    import dhlab
+    seconds["import"] += time.perf_counter() - start
+if {warm_up}:
+    start = time.perf_counter()
+    sentiment.warm_up("benchmark")
+    seconds["warm_up"] = time.perf_counter() - start
+sentiment.set_client(StubClient())
+corpus = make_corpus({docs})
+start = time.perf_counter()
+sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=sentiment.load_lexicon("benchmark"))
+seconds["first_request"] = time.perf_counter() - start
+print(json.dumps(seconds))
+"""
+
+SCENARIOS = {
+    "eager dhlab import": dict(eager=True, warm_up=False),
+    "lazy imports": dict(eager=False, warm_up=False),
+    "lazy imports + warm_up": dict(eager=False, warm_up=True),
+}
+
+
+def run(docs: int, env: dict, **options) -> dict:
+    code = CHILD.format(docs=docs, **options)
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=dict(env, PYTHONPATH=str(ROOT)), cwd=ROOT,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="processes per scenario")
+    parser.add_argument("--docs", type=int, default=200, help="documents in the first request")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sentiment.save_lexicon(frozen_lexicon(), Path(tmp) / "benchmark.json.gz")
+        env = dict(os.environ, SENTIMENT_LEXICON_DIR=tmp, SENTIMENT_CACHE_DIR=tmp)
+        rows = {}
+        for name, options in SCENARIOS.items():
+            runs = pd.DataFrame([run(args.docs, env, **options) for _ in range(args.runs)])
+            rows[name] = runs.median()
+
+    report = pd.DataFrame(rows).T.reindex(columns=["import", "warm_up", "first_request"])
+    report["ready_to_answer"] = report.drop(columns="first_request").sum(axis=1)
+    report["first_answer"] = report.ready_to_answer + report.first_request
+    print(f"Median seconds of {args.runs} fresh processes, first request on {args.docs} documents:")
+    print(report.to_string(float_format=lambda x: f"{x:.3f}", na_rep="-"))
+
+
+if __name__ == "__main__":
+    main()
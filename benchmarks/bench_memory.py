@@ -0,0 +1,53 @@
+"""Memory report of the compact result frame of ``count_and_score_target_words``.
+
+Runs the pipeline offline on a synthetic corpus, and compares the memory of each column
+with the object and int64 columns the result had before ``compact_frame``.
+
+Usage:
+    python -m benchmarks.bench_memory              # 20,000 documents
+    python -m benchmarks.bench_memory --docs 5000
+"""
+import argparse
+
+import pandas as pd
+
+import sentiment
+from tests.helpers import StubClient, frozen_lexicon, make_corpus
+
+
+def widen(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert compact columns back to object and int64 columns."""
+    return df.astype(
+        {
+            col: "int64" if pd.api.types.is_integer_dtype(dtype) else object
+            for col, dtype in df.dtypes.items()
+            if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype))
+            or pd.api.types.is_integer_dtype(dtype)
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20_000, help="number of documents")
+    args = parser.parse_args()
+
+    sentiment.set_client(StubClient())
+    corpus = make_corpus(args.docs)
+    result = sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=frozen_lexicon())
+    report = pd.DataFrame(
+        {
+            "before": widen(result).memory_usage(index=False, deep=True),
+            "after": result.memory_usage(index=False, deep=True),
+            "dtype": result.dtypes.astype(str),
+        }
+    )
+    report.loc["total"] = [report.before.sum(), report.after.sum(), ""]
+    report[["before", "after"]] = report[["before", "after"]] / 2**20
+    report["saved"] = 1 - report.after / report.before
+    print(f"{len(result)} rows for {args.docs} documents, memory in MB:")
+    print(report.to_string(float_format=lambda x: f"{x:.2f}", formatters={"saved": "{:.0%}".format}))
+
+
+if __name__ == "__main__":
+    main()
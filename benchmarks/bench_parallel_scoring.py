@@ -0,0 +1,39 @@
+"""Benchmark how scoring with ``score_snippets_parallel`` scales with the number of workers.
+
+Usage: python -m benchmarks.bench_parallel_scoring --snippets 200000 --max-workers 16
+"""
+import argparse
+import os
+import time
+
+from sentiment import score_snippets_parallel
+from tests.helpers import frozen_lexicon, make_snippets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snippets", type=int, default=100_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=2000)
+    args = parser.parse_args()
+
+    lexicon = frozen_lexicon()
+    texts = make_snippets(args.snippets)
+    workers = sorted({1, *[2**i for i in range(1, 8)], args.max_workers})
+
+    expected = None
+    print(f"{'workers':>8} {'seconds':>9} {'snippets/s':>12} {'speedup':>8}")
+    for n in [w for w in workers if w <= args.max_workers]:
+        start = time.perf_counter()
+        scores = score_snippets_parallel(
+            texts, lexicon, workers=n, chunksize=args.chunksize
+        )
+        seconds = time.perf_counter() - start
+        if expected is None:
+            expected, baseline = scores, seconds
+        assert scores.equals(expected), f"Scores with {n} workers differ from 1 worker"
+        print(f"{n:>8} {seconds:>9.2f} {len(texts) / seconds:>12.0f} {baseline / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Offline micro-benchmarks of the sentiment scoring hot paths.
+
+Each case runs on synthetic data at several sizes, and reports the best wall time
+of a few repeats, the throughput and the peak memory allocated by Python (tracemalloc).
+The results are compared with the stored baselines in ``baseline.json``,
+and the exit code is 1 if any case is slower than ``--threshold`` times its baseline.
+
+Usage:
+    python -m benchmarks.bench_scoring                    # compare with the baselines
+    python -m benchmarks.bench_scoring --save-baseline    # store new baselines
+    python -m benchmarks.bench_scoring --filter score     # only cases matching "score"
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+from importlib import metadata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import sentiment
+from tests.helpers import (
+    StubClient,
+    frozen_lexicon,
+    make_collocation,
+    make_corpus,
+    make_snippets,
+)
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+
+
+def snippet_cases(lexicon):
+    pos, neg = lexicon.as_frames()
+    for n in (100, 1000, 5000):
+        texts = make_snippets(n)
+        counts = [sentiment.count_tokens(t) for t in texts]
+        yield f"count_tokens[{n}]", n, lambda texts=texts: [
+            sentiment.count_tokens(t) for t in texts
+        ]
+        yield f"count_matching_tokens[{n}]", n, lambda counts=counts: [
+            sentiment.count_matching_tokens(c, pos) for c in counts
+        ]
+        yield f"score_sentiment[{n}]", n, lambda texts=texts: [
+            sentiment.score_sentiment(t, pos, neg) for t in texts
+        ]
+        yield f"score_snippets[{n}]", n, lambda texts=texts: sentiment.score_snippets(
+            texts, lexicon
+        )
+        yield f"LexiconMatcher.count_many[{n}]", n, lambda texts=texts: (
+            lexicon.matcher.count_many(texts)
+        )
+
+
+def collocation_cases(lexicon):
+    for n in (1000, 10_000, 100_000):
+        coll = make_collocation(n)
+        yield f"group_index_terms[{n}]", n, lambda coll=coll: sentiment.group_index_terms(
+            coll.copy()
+        )
+        yield f"coll_sentiment[{n}]", n, lambda coll=coll: sentiment.coll_sentiment(
+            coll.copy(), lexicon=lexicon
+        )
+
+
+def pipeline_cases(lexicon):
+    sentiment.set_client(StubClient())
+    for n in (100, 1000, 5000):
+        corpus = make_corpus(n)
+        yield f"count_and_score_target_words[{n}]", n, lambda corpus=corpus: (
+            sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=lexicon)
+        )
+
+
+def measure(func, repeats: int) -> dict:
+    """Measure the peak memory of one call to ``func``, and the best time of ``repeats`` rounds.
+
+    Fast functions are called several times per round, so each round lasts at least 0.2 seconds.
+    """
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timer = timeit.Timer(func)
+    number = timer.autorange()[0]
+    seconds = min(timer.repeat(repeat=repeats, number=number)) / number
+    return {"seconds": seconds, "peak_bytes": peak}
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "dhlab": metadata.version("dhlab"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--filter", default="", help="only run cases containing this string")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    lexicon = frozen_lexicon()
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = {}
+    regressions = []
+
+    print(f"{'case':<40} {'seconds':>9} {'items/s':>11} {'peak MB':>8} {'vs base':>8}")
+    for cases in (snippet_cases, collocation_cases, pipeline_cases):
+        for name, size, func in cases(lexicon):
+            if args.filter not in name:
+                continue
+            result = measure(func, args.repeats)
+            results[name] = result
+            base = baseline.get("results", {}).get(name)
+            ratio = result["seconds"] / base["seconds"] if base else float("nan")
+            if ratio > args.threshold:
+                regressions.append(name)
+            print(
+                f"{name:<40} {result['seconds']:>9.4f} {size / result['seconds']:>11.0f} "
+                f"{result['peak_bytes'] / 1e6:>8.1f} {ratio:>8.2f}"
+            )
+
+    if args.save_baseline:
+        merged = {**baseline.get("results", {}), **results}
+        args.baseline.write_text(
+            json.dumps({"environment": environment(), "results": merged}, indent=2) + "\n"
+        )
+        print(f"Saved baselines to {args.baseline}")
+    elif regressions:
+        print(f"Slower than {args.threshold}x baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,67 @@
+import argparse
+import asyncio
+import contextvars
+import gzip
+import hashlib
+import itertools
+import json
 import logging
+import os
+import pickle
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
 import numpy as np
 import pandas as pd
 import requests
 
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache, partial
+from io import BytesIO, StringIO, TextIOWrapper
 from pathlib import Path
-from typing import Generator, List, Union
+from statistics import NormalDist
+from typing import Generator, List, Tuple, Union
 
-import dhlab as dh
-from dhlab.api.dhlab_api import concordance, get_chunks_para
-from dhlab.constants import BASE_URL
-from dhlab.nbtokenizer import tokenize
+from requests.adapters import HTTPAdapter
+
+# Lazy imports
+def import_dhlab():
+    """Import ``dhlab`` on first use, since it takes seconds to import all its dependencies."""
+    import dhlab
+
+    return dhlab
+
+
+def import_tokenizer():
+    """Import the dhlab tokenizer on first use.
+
+    Newer dhlab versions depend on the ``nb_tokenizer`` package, which imports without dhlab.
+    Older versions ship the tokenizer as ``dhlab.text.nbtokenizer``, which imports all of dhlab.
+    """
+    try:
+        import nb_tokenizer
+    except ImportError:  # dhlab without the nb_tokenizer dependency
+        from dhlab.text import nbtokenizer as nb_tokenizer
+    return nb_tokenizer
+
+
+def is_corpus(obj) -> bool:
+    """Check if ``obj`` is a ``dh.Corpus``, without importing the dhlab modules that define it."""
+    return any(
+        cls.__name__ == "Corpus" and cls.__module__.startswith("dhlab.") for cls in type(obj).__mro__
+    )
 
 
 # File handling util functions
 def load_corpus_from_file(file_path):
     """Load a Corpus object from an excel or csv file."""
+    dh = import_dhlab()
     try:
         corpus = (
             dh.Corpus.from_df(pd.read_excel(file_path))
@@ -28,26 +74,182 @@ def load_corpus_from_file(file_path):
     return corpus
 
 
-def load_sentiment_terms(fpath: str = None) -> pd.Series:
-    """Load a sentiment lexicon from a file path."""
-    if fpath is None or not Path(fpath).exists:
-        print("File not found: ", fpath)
-    return pd.read_csv(fpath, names=["terms"])
+def load_sentiment_terms(fpath: Union[str, Path] = None) -> pd.DataFrame:
+    """Load a sentiment lexicon with one term per line from a local file path or a URL."""
+    is_url = str(fpath).startswith(("http://", "https://"))
+    if fpath is None or (not is_url and not Path(fpath).exists()):
+        raise FileNotFoundError(f"Lexicon file not found: {fpath}")
+    terms = pd.read_csv(fpath, names=["terms"], keep_default_na=False)
+    return terms.loc[terms.terms != ""].reset_index(drop=True)
+
+
+# Sentiment lexicons
+NORSENTLEX_URL = "https://raw.githubusercontent.com/ltgoslo/norsentlex/master/Fullform/Fullform_{sentiment}_lexicon.txt"
+LEXICON_DIR = Path(
+    os.environ.get("SENTIMENT_LEXICON_DIR", Path.home() / ".cache" / "sentimentanalyse")
+)
+LEXICON_FORMAT = 1
 
 
-def load_norsentlex() -> List[pd.Series]:
+@dataclass(frozen=True)
+class Lexicon:
+    """Positive and negative sentiment terms, stored as hashed term sets.
+
+    The ``checksum`` is computed from the sorted terms,
+    so two lexicons with the same terms have the same ``version``.
+    """
+
+    name: str
+    positive: frozenset
+    negative: frozenset
+    checksum: str = ""
+
+    def __post_init__(self):
+        if not self.checksum:
+            object.__setattr__(self, "checksum", lexicon_checksum(self.positive, self.negative))
+
+    @property
+    def version(self) -> str:
+        return f"{self.name}-{self.checksum[:12]}"
+
+    @cached_property
+    def term_index(self) -> pd.Index:
+        """All the terms, with a hash table that is built on first lookup and then reused."""
+        return pd.Index(sorted(self.positive | self.negative))
+
+    @cached_property
+    def term_polarity(self) -> np.ndarray:
+        """Positive and negative flags of each term in ``term_index``."""
+        return np.array(
+            [(term in self.positive, term in self.negative) for term in self.term_index],
+            dtype=bool,
+        ).reshape(-1, 2)
+
+    def polarity(self, terms) -> np.ndarray:
+        """Look up ``terms`` in the lexicon.
+
+        :return: a boolean array with a positive and a negative column, one row per term
+        """
+        positions = self.term_index.get_indexer(terms)
+        found = positions >= 0
+        polarity = np.zeros((len(positions), 2), dtype=bool)
+        polarity[found] = self.term_polarity[positions[found]]
+        return polarity
+
+    @cached_property
+    def matcher(self) -> "LexiconMatcher":
+        """A matcher compiled from the terms, built on first use."""
+        return LexiconMatcher(self)
+
+    def as_frames(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Return the positive and negative terms as dataframes with a ``terms`` column."""
+        return tuple(
+            pd.DataFrame(sorted(terms), columns=["terms"])
+            for terms in (self.positive, self.negative)
+        )
+
+
+def lexicon_checksum(positive, negative) -> str:
+    """Compute a sha256 checksum of the positive and negative term sets."""
+    digest = hashlib.sha256()
+    for terms in (positive, negative):
+        digest.update("\n".join(sorted(terms)).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def save_lexicon(lexicon: Lexicon, path: Union[str, Path]) -> Path:
+    """Write a compiled ``lexicon`` to a gzipped json file.
+
+    The file is written under a temporary name and then moved into place,
+    so concurrent compiles and readers never see a partly written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = {
+        "format": LEXICON_FORMAT,
+        "name": lexicon.name,
+        "checksum": lexicon.checksum,
+        "positive": sorted(lexicon.positive),
+        "negative": sorted(lexicon.negative),
+    }
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(content, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return path
+
+
+def read_lexicon(path: Union[str, Path]) -> Lexicon:
+    """Read a compiled lexicon file, and verify its format and checksum."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        content = json.load(f)
+    if content.get("format") != LEXICON_FORMAT:
+        raise ValueError(f"Unsupported lexicon format in {path}: {content.get('format')}")
+    lexicon = Lexicon(
+        name=content["name"],
+        positive=frozenset(content["positive"]),
+        negative=frozenset(content["negative"]),
+    )
+    if lexicon.checksum != content["checksum"]:
+        raise ValueError(f"Checksum mismatch in lexicon file {path}")
+    return lexicon
+
+
+def build_lexicon(
+    positive: Union[str, Path] = NORSENTLEX_URL.format(sentiment="Positive"),
+    negative: Union[str, Path] = NORSENTLEX_URL.format(sentiment="Negative"),
+    name: str = "norsentlex",
+    path: Union[str, Path] = None,
+) -> Lexicon:
+    """Compile a lexicon from positive and negative term lists and store it on disk.
+
+    :param positive: local path or URL to a file with one positive term per line
+    :param negative: local path or URL to a file with one negative term per line
+    :param str name: name of the lexicon, used in the file name and ``Lexicon.version``
+    :param path: output file, defaults to ``<LEXICON_DIR>/<name>.json.gz``
+    """
+    pos, neg = [load_sentiment_terms(fpath).terms for fpath in (positive, negative)]
+    lexicon = Lexicon(name=name, positive=frozenset(pos), negative=frozenset(neg))
+    save_lexicon(lexicon, path or LEXICON_DIR / f"{name}.json.gz")
+    return lexicon
+
+
+@lru_cache(maxsize=None)
+def load_lexicon(name: str = "norsentlex", path: Union[str, Path] = None) -> Lexicon:
+    """Load a compiled lexicon once per process.
+
+    NorSentLex is downloaded and compiled the first time it is used,
+    later calls and processes read the compiled file without network access.
+    Other lexicons must be compiled with ``build_lexicon`` first.
+    """
+    path = Path(path or LEXICON_DIR / f"{name}.json.gz")
+    if path.exists():
+        return read_lexicon(path)
+    if name != "norsentlex":
+        raise FileNotFoundError(f"No compiled lexicon at {path}, run build_lexicon first.")
+    logging.info(f"Compiling NorSentLex to {path}")
+    try:
+        return build_lexicon(name=name, path=path)
+    except OSError as e:
+        raise FileNotFoundError(
+            f"NorSentLex is not compiled at {path} and could not be downloaded: {e}"
+        ) from e
+
+
+def load_norsentlex() -> List[pd.DataFrame]:
     """Load the sentiment lexicons from ``ǸorsentLex``.
 
     - Github repo [norsentlex](https://github.com/ltgoslo/norsentlex)
     - [Lexicon information in neural sentiment analysis:
     a multi-task learning approach](https://aclanthology.org/W19-6119) (Barnes et al., NoDaLiDa 2019)
+
+    The lexicon is read from the compiled store, see ``load_lexicon``.
     """
-    fpath = "https://raw.githubusercontent.com/ltgoslo/norsentlex/master/Fullform/Fullform_{sentiment}_lexicon.txt"
-    pos, neg = [
-        load_sentiment_terms(fpath.format(sentiment=sent))
-        for sent in ("Positive", "Negative")
-    ]
-    return pos, neg
+    return load_lexicon().as_frames()
 
 
 # Helper functions
@@ -74,6 +276,18 @@ def strip_bold_annotation(text):
     return text.replace("<b>", "").replace("</b>", "")
 
 
+def split_bold_annotation(text: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """Strip the bold annotation from ``text``, and return the character spans that were in bold."""
+    parts, spans, pos = [], [], 0
+    for i, part in enumerate(re.split(r"<b>(.*?)</b>", text)):
+        part = strip_bold_annotation(part)
+        if i % 2:
+            spans.append((pos, pos + len(part)))
+        parts.append(part)
+        pos += len(part)
+    return "".join(parts), spans
+
+
 def make_search_link(docid: str, search_term: str = None):
     """Create a URL to the online library view of the digital object, with the search term"""
 
@@ -91,7 +305,7 @@ def add_urls(df):
 
 def count_tokens(text):
     text = strip_bold_annotation(text)
-    tokens = tokenize(text)
+    tokens = import_tokenizer().tokenize(text)
     newcoll = Counter([tok.lower() for tok in tokens if not tok == "..."])
     return pd.Series(newcoll.values(), index=newcoll.keys(), name="counts")
 
@@ -101,38 +315,557 @@ def strip_empty_cols(df: pd.DataFrame):
     return df.dropna(axis=1, how="all").fillna("")
 
 
+@lru_cache
+def string_dtype() -> str:
+    """Arrow-backed strings if pyarrow is installed, else pandas' own string dtype."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "string"
+    return "string[pyarrow]"
+
+
+def compact_frame(df: pd.DataFrame, max_category_ratio: float = 0.5) -> pd.DataFrame:
+    """Store the columns of ``df`` with compact dtypes.
+
+    Text columns with at most ``max_category_ratio`` distinct values per row become categoricals,
+    other text columns become ``string_dtype`` columns,
+    and integer columns get the narrowest integer dtype that holds their values.
+    Aggregations like ``sum`` and ``mean`` return int64 or float64, but element-wise arithmetic
+    keeps the narrow dtype and wraps around on overflow, e.g. ``df.positive * 1000`` on int8,
+    so convert with ``astype("int64")`` first.
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object:
+            if values.nunique() <= max_category_ratio * len(values):
+                columns[col] = values.astype("category")
+            else:
+                columns[col] = values.astype(string_dtype())
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            columns[col] = pd.to_numeric(values, downcast="integer")
+    return df.assign(**columns)
+
+
+def concat_compact(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate frames from ``compact_frame``, and remove the columns without values.
+
+    A column that is categorical in any of the frames is categorical in the result,
+    with the categories of all the frames. Frames without rows keep all their columns.
+    """
+    categorical = {
+        col
+        for df in frames
+        for col in df.columns
+        if isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    dtypes = {}
+    for col in categorical:
+        values = set()
+        for df in frames:
+            if col in df:
+                values.update(df[col].dropna().unique())
+        dtypes[col] = pd.CategoricalDtype(sorted(values, key=str))
+    df = pd.concat(
+        [df.astype({col: dtype for col, dtype in dtypes.items() if col in df}) for df in frames],
+        ignore_index=True,
+    )
+    empty = df.columns[df.isna().all()] if len(df) else []
+    return df.drop(columns=empty) if len(empty) else df
+
+
 def group_index_terms(df: pd.DataFrame) -> pd.DataFrame:
     """Group duplicate index terms, make them case-insensitive, and sum up their frequency counts."""
     if hasattr(df, "frame"):
         df = df.frame
+    if isinstance(df, pd.DataFrame):
+        df = df["counts"]
     df = df.loc[df.index.str.isalpha()]
     df.index = df.index.str.lower()
     df = df.groupby(df.index).sum().to_frame("counts")
     return df
 
 
+# Instrumentation
+_metrics = contextvars.ContextVar("metrics", default=None)
+_stage_record = contextvars.ContextVar("stage_record", default=None)
+
+
+def resident_memory_mb() -> float:
+    """Current resident memory of this process in MB, or NaN without ``/proc``, e.g. on macOS."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return float("nan")
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+class PipelineMetrics:
+    """Wall time, rows, bytes fetched and memory growth per stage of an analysis.
+
+    Stages that run several times, e.g. once per batch, are summed up,
+    except ``memory_mb``, which is the largest growth of the resident memory over one run of the stage.
+    The memory is measured for the whole process, so it includes stages running in other threads.
+    """
+
+    columns = ["calls", "seconds", "rows", "bytes", "memory_mb"]
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, rows: int = 0, nbytes: int = 0, memory: float = 0):
+        with self._lock:
+            stage = self.stages.setdefault(name, dict.fromkeys(self.columns, 0))
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["rows"] += rows
+            stage["bytes"] += nbytes
+            stage["memory_mb"] = memory if stage["calls"] == 1 else max(stage["memory_mb"], memory)
+        logging.info(
+            f"Stage {name}: {seconds:.3f}s, {rows} rows, {nbytes} bytes, {memory:+.1f} MB",
+            extra={
+                "stage": name, "seconds": seconds, "rows": rows, "bytes": nbytes, "memory_mb": memory
+            },
+        )
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {name: dict(stage) for name, stage in self.stages.items()}
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame.from_dict(
+            self.to_dict(), orient="index", columns=self.columns
+        ).rename_axis("stage")
+
+    def to_prometheus(self, prefix: str = "sentiment") -> str:
+        """Format the metrics as Prometheus counters in the text exposition format."""
+        lines = []
+        for column in self.columns:
+            kind = "gauge" if column == "memory_mb" else "counter"
+            name = f"{prefix}_stage_{column}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# TYPE {name} {kind}")
+            lines += [
+                f'{name}{{stage="{stage}"}} {values[column]}'
+                for stage, values in self.to_dict().items()
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Union[str, Path], prefix: str = "sentiment"):
+        """Write the counters to ``path``, e.g. for the node exporter textfile collector."""
+        path = Path(path)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(self.to_prometheus(prefix))
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def collect_metrics() -> Generator[PipelineMetrics, None, None]:
+    """Collect the stages run inside this context, or inside an already active collection."""
+    metrics = _metrics.get()
+    if metrics is not None:
+        yield metrics
+        return
+    metrics = PipelineMetrics()
+    token = _metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _metrics.reset(token)
+
+
+@contextmanager
+def stage(name: str, rows: int = 0) -> Generator[dict, None, None]:
+    """Time a stage of the analysis, if metrics are collected with ``collect_metrics``.
+
+    Set ``rows`` in the yielded record to count the rows processed by the stage.
+    Bytes received by the ``DhlabClient`` during the stage are counted automatically.
+    """
+    record = {"rows": rows, "bytes": 0}
+    token = _stage_record.set(record)
+    memory = resident_memory_mb() if _metrics.get() is not None else 0
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _stage_record.reset(token)
+        metrics = _metrics.get()
+        if metrics is not None:
+            memory = resident_memory_mb() - memory
+            metrics.add(name, time.perf_counter() - start, record["rows"], record["bytes"], memory)
+
+
+def record_bytes(nbytes: int):
+    """Count ``nbytes`` received in the current stage."""
+    record = _stage_record.get()
+    if record is not None:
+        record["bytes"] += nbytes
+
+
+def submit_in_context(pool: Executor, func, *args, **kwargs) -> Future:
+    """Submit ``func`` to a thread ``pool``, so it runs in the current stage and metrics context."""
+    return pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+# DHLAB API client
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Let at most ``rate`` calls per second pass through ``wait``, shared between threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Sleep until the next call is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+class DhlabClient:
+    """A shared HTTP client for the DHLAB API.
+
+    Connections are kept alive in a pool, at most ``max_connections`` requests run at once,
+    and failed requests are retried with exponential backoff.
+
+    :param str base_url: API address, defaults to the dhlab API, e.g. a local stand-in server for testing
+    :param timeout: connect and read timeout in seconds
+    :param int retries: number of retries after connection errors, timeouts
+        and the status codes in ``RETRY_STATUS``
+    :param float backoff: seconds to wait before the first retry, doubled for each retry
+    :param int max_connections: size of the connection pool and max concurrent requests
+    :param cache: a ``ResponseCache`` for POST responses, or None to always send the request
+    :param float rate_limit: max number of requests per second, or None for no limit
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        timeout: Tuple[float, float] = (10, 300),
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_connections: int = 8,
+        cache: "ResponseCache" = None,
+        rate_limit: float = None,
+    ):
+        if base_url is None:
+            from dhlab.constants import BASE_URL
+
+            base_url = BASE_URL
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Send a request to ``endpoint``, and retry on transient errors."""
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        for attempt in range(self.retries + 1):
+            try:
+                self.throttle()
+                with self._slots:
+                    r = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                record_bytes(len(r.content))
+                if r.status_code not in RETRY_STATUS or attempt == self.retries:
+                    r.raise_for_status()
+                    return r
+                reason = f"status {r.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                reason = repr(e)
+            delay = self.backoff * 2**attempt
+            logging.warning(f"{method} {url} failed ({reason}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def throttle(self):
+        """Wait for the rate limiter, also for requests sent by other libraries like dhlab."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+
+    def get(self, endpoint: str, params: dict = None, use_cache: bool = True):
+        """Send a GET request and return the decoded json response.
+
+        :param bool use_cache: if False, bypass the cached response and store a fresh one
+        """
+        send = lambda: self.request("GET", endpoint, params=params).json()
+        if self.cache is None:
+            return send()
+        key = {"url": f"{self.base_url}/{endpoint.lstrip('/')}", "params": params}
+        return self.cache.get_or_set(key, send, use_cache=use_cache)
+
+    def post(self, endpoint: str, json: dict = None, use_cache: bool = True):
+        """Send a POST request and return the decoded json response.
+
+        :param bool use_cache: if False, bypass the cached response and store a fresh one
+        """
+        send = lambda: self.request("POST", endpoint, json=json).json()
+        if self.cache is None:
+            return send()
+        key = {"url": f"{self.base_url}/{endpoint.lstrip('/')}", "json": json}
+        return self.cache.get_or_set(key, send, use_cache=use_cache)
+
+    async def apost(self, endpoint: str, json: dict = None, use_cache: bool = True):
+        """Asyncio variant of ``post``, running the request in a thread."""
+        # Same as asyncio.to_thread, which needs Python 3.9
+        call = partial(contextvars.copy_context().run, self.post, endpoint, json, use_cache)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    async def apost_many(self, endpoint: str, payloads: List[dict]) -> list:
+        """Send one POST request per payload concurrently, and return the responses in order."""
+        return await asyncio.gather(*(self.apost(endpoint, p) for p in payloads))
+
+
+_client = None
+# Creates the process-wide client and response cache once, also when threads ask at the same time
+_client_lock = threading.RLock()
+
+
+def get_client() -> DhlabClient:
+    """Get the process-wide ``DhlabClient``.
+
+    It caches responses in ``get_response_cache()``, and sends at most 10 requests per second.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DhlabClient(cache=get_response_cache(), rate_limit=10)
+    return _client
+
+
+def set_client(client: DhlabClient):
+    """Replace the process-wide ``DhlabClient``, e.g. with one pointing to a test server."""
+    global _client
+    _client = client
+
+
+# Response cache
+# Tells a missing entry from a cached None response
+_MISSING = object()
+CACHE_DIR = Path(
+    os.environ.get("SENTIMENT_CACHE_DIR", Path.home() / ".cache" / "sentimentanalyse")
+)
+
+
+class ResponseCache:
+    """A persistent SQLite cache of API responses, keyed by a hash of the request parameters.
+
+    Entries older than ``ttl`` seconds are ignored and removed,
+    and the least recently used entries are evicted when the cache grows beyond ``max_bytes``.
+    ``hits`` and ``misses`` count lookups in this process.
+
+    :param path: SQLite database file
+    :param float ttl: max age of an entry in seconds
+    :param int max_bytes: max total size of the compressed entries
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = CACHE_DIR / "responses.sqlite",
+        ttl: float = 30 * 24 * 3600,
+        max_bytes: int = 2 * 1024**3,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, created REAL, accessed REAL, size INTEGER, value BLOB)"
+            )
+            # expiry and eviction look up the oldest entries without sorting the table
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @staticmethod
+    def make_key(params) -> str:
+        """Hash json-serializable request parameters into a cache key."""
+        content = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, default=None):
+        """Return the cached value for ``key``, or ``default`` if it is missing or expired."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT created, value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[0] <= self.ttl:
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return pickle.loads(zlib.decompress(row[1]))
+            self.misses += 1
+        return default
+
+    def set(self, key: str, value):
+        """Store ``value`` for ``key``, and evict expired and least recently used entries."""
+        now = time.time()
+        blob = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(blob), blob),
+            )
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            excess = total - self.max_bytes
+            if excess <= 0:
+                return
+            evicted = []
+            for old_key, size in self._db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed"
+            ):
+                evicted.append((old_key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def get_or_set(self, params, compute, use_cache: bool = True):
+        """Return the cached value for the request ``params``, or compute and store it.
+
+        :param compute: function without arguments that returns the value
+        :param bool use_cache: if False, always compute the value and replace the cached one
+        """
+        key = self.make_key(params)
+        value = self.get(key, _MISSING) if use_cache else _MISSING
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Count hits, misses, entries and total size of the cache."""
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_response_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide ``ResponseCache`` in ``CACHE_DIR``."""
+    global _response_cache
+    if _response_cache is None:
+        with _client_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
+
+
+def load_corpus(
+    use_cache: bool = True, limit: int = 10, order_by: str = "random", **params
+) -> pd.DataFrame:
+    """Build a corpus from metadata like ``dh.Corpus(**params)``, and return its dataframe.
+
+    Same ``/build_corpus`` request as ``dh.Corpus``, sent with the shared ``DhlabClient``,
+    so dhlab is not imported. Corpora built with ``order_by="random"`` (the dhlab default)
+    are cached too, so the same parameters give the same documents until the entry expires.
+
+    :param bool use_cache: if False, bypass the cached corpus and store a fresh one
+    :param params: the metadata filters of ``dh.Corpus``, e.g. ``doctype``, ``fulltext``,
+        ``freetext``, ``title``, ``from_year`` and ``to_year``
+    """
+    filters = {key: value for key, value in params.items() if value is not None}
+    with stage("corpus") as record:
+        if filters:
+            payload = {**filters, "limit": limit, "order_by": order_by}
+            result = get_client().post("build_corpus", payload, use_cache=use_cache)
+            # dh.Corpus keeps the last of duplicated URNs
+            corpus = pd.DataFrame(result).drop_duplicates(subset="urn", keep="last")
+            corpus = corpus.reset_index(drop=True)
+        else:
+            corpus = pd.DataFrame(columns=["urn"])
+        record["rows"] = len(corpus)
+    return corpus
+
+
+def fetch_collocation(
+    urns: List[str],
+    word: str,
+    before: int = 10,
+    after: int = 10,
+    samplesize: int = 20000,
+    use_cache: bool = True,
+) -> pd.Series:
+    """Fetch the collocation counts of ``word`` in the documents ``urns``.
+
+    Same request as ``dh.Corpus.coll``, sent with the shared ``DhlabClient``.
+    """
+    params = {
+        "urn": urns,
+        "word": word,
+        "before": before,
+        "after": after,
+        "samplesize": samplesize,
+    }
+    result = get_client().post("urncolldist_urn", params, use_cache=use_cache)
+    coll = pd.read_json(StringIO(result))
+    if coll.empty:
+        return pd.Series(dtype="int64", name="counts")
+    return coll["counts"]
+
+
 # Sentiment scoring functions: Number crunching
 
 
 def count_terms_in_doc(
     urns: List[str],
     words: Union[list, str],
-    docid_column="dhlabid"
+    docid_column="dhlabid",
+    use_cache: bool = True,
+    strict: bool = False,
 ):
     """Similar functionality as ``dhlab.api.dhlab_api.get_document_frequencies``,
     except the dataframe isn't pivoted.
+
+    :param bool strict: if True, raise when the response can't be decoded,
+        instead of returning an empty dataframe as if ``words`` never occur in ``urns``
     """
     params = {"urns": urns, "words": make_list(words), "cutoff": 0}
     cols = [docid_column, "word", "count", "urncount"]
-    try:
-        r = requests.post(f"{BASE_URL}/frequencies", json=params)
-        r.raise_for_status
-        result = r.json()
-        df = pd.DataFrame(result, columns=cols)
-    except requests.exceptions.JSONDecodeError as e:
-        logging.error(f"Couldn't decode JSON object: {e}")
-        logging.info(f"Returning empty dataframe instead of word counts")
-        df = pd.DataFrame(columns=cols)
+    with stage("frequencies") as record:
+        try:
+            result = get_client().post("frequencies", params, use_cache=use_cache)
+            df = pd.DataFrame(result, columns=cols)
+        except requests.exceptions.JSONDecodeError as e:
+            if strict:
+                raise
+            logging.error(f"Couldn't decode JSON object: {e}")
+            logging.info(f"Returning empty dataframe instead of word counts")
+            df = pd.DataFrame(columns=cols)
+        record["rows"] = len(df)
 
     df = df.drop("urncount", axis=1)
     #    df = pd.pivot_table(df, values="count", index="word", columns="urn").fillna(0)
@@ -145,7 +878,26 @@ def count_matching_tokens(token_counts: pd.DataFrame, terms: pd.Series) -> pd.Da
     return target_terms
 
 
-def coll_sentiment(coll, word="barnevern", return_score_only=False):
+def partition_terms(coll: pd.DataFrame, lexicon: Lexicon = None) -> pd.DataFrame:
+    """Label the terms of a collocation as positive, negative or neutral in a single pass.
+
+    :param coll: a dataframe with a ``counts`` column, indexed by lowercased terms,
+        see ``group_index_terms``
+    :return: the positive, negative and neutral terms, in that order,
+        with a ``sentiment`` column of ``"pos"``, ``"neg"`` or ``"neutral"``.
+        Terms that are both positive and negative are in both groups.
+    """
+    polarity = (lexicon or load_lexicon()).polarity(coll.index)
+    groups = (polarity[:, 0], polarity[:, 1], ~polarity.any(axis=1))
+    labels = ["pos", "neg", "neutral"]
+    df = pd.concat([coll.loc[rows] for rows in groups])
+    df["sentiment"] = pd.Categorical(
+        np.repeat(labels, [rows.sum() for rows in groups]), categories=labels
+    )
+    return df
+
+
+def coll_sentiment(coll, word="barnevern", return_score_only=False, lexicon: Lexicon = None):
     """Compute a sentiment score of positive and negative terms in `coll`.
 
     The collocations of the ``word`` are used to count occurrences of positive and negative terms.
@@ -154,60 +906,164 @@ def coll_sentiment(coll, word="barnevern", return_score_only=False):
     :param str word: a word to estimate sentiment scores for
     :param bool return_score_only: If True,
         return a tuple with the absolute counts for positive and negative terms.
+    :param lexicon: sentiment lexicon to score with, defaults to NorSentLex.
+    :return: the terms with their ``counts`` and ``sentiment``, see ``partition_terms``
     """
-    if isinstance(coll, dh.Corpus):
+    if is_corpus(coll):
         coll = coll.coll(word).frame
 
     coll = group_index_terms(coll)
-
-    # Data import
-    pos, neg = load_norsentlex()
-
-    positive_counts = count_matching_tokens(coll, pos)
-    negative_counts = count_matching_tokens(coll, neg)
+    polarity = (lexicon or load_lexicon()).polarity(coll.index)
 
     if return_score_only:
-        return positive_counts.counts.sum(), negative_counts.counts.sum()
-
-    neutral_counts = coll.join(
-        pd.DataFrame(
-            pd.concat([coll, negative_counts, positive_counts]).index.drop_duplicates(
-                keep=False
+        counts = coll.counts.to_numpy()
+        return counts[polarity[:, 0]].sum(), counts[polarity[:, 1]].sum()
+
+    return partition_terms(coll, lexicon)
+
+
+def coll_sentiment_many(
+    corpus: pd.DataFrame,
+    words: List[str],
+    before: int = 10,
+    after: int = 10,
+    samplesize: int = 20000,
+    lexicon: Lexicon = None,
+    workers: int = 8,
+    use_cache: bool = True,
+) -> pd.DataFrame:
+    """Compute the collocation sentiment of several ``words`` in one corpus.
+
+    The collocations of the words are fetched concurrently,
+    and the terms of each are labelled with ``partition_terms``.
+
+    :param corpus: a dh.Corpus or a corpus dataframe with a ``urn`` column
+    :param list words: words to estimate sentiment scores for
+    :param int workers: max number of collocations fetched at the same time
+    :return: a dataframe indexed by ``word`` and ``term``, with the ``counts``
+        of each term around the word and its ``sentiment``
+    """
+    if is_corpus(corpus):
+        corpus = corpus.frame
+    lexicon = lexicon or load_lexicon()
+    urns = corpus.urn.to_list()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            submit_in_context(
+                pool, fetch_collocation, urns, word, before, after, samplesize, use_cache
             )
-        ).set_index(0),
-        how="inner",
-    )
+            for word in words
+        ]
+        colls = [future.result() for future in futures]
+
+    with stage("partition", rows=sum(len(coll) for coll in colls)):
+        frames = [
+            partition_terms(
+                group_index_terms(coll) if not coll.empty else coll.to_frame("counts"), lexicon
+            )
+            for coll in colls
+        ]
+        df = pd.concat(frames, keys=words, names=["word", "term"])
+    return df
+
+
+def facet_corpus_params(facet: dict, **params) -> dict:
+    """Translate a facet into ``dh.Corpus`` parameters.
 
-    positive_counts["sentiment"] = "pos"
-    negative_counts["sentiment"] = "neg"
-    neutral_counts["sentiment"] = "neutral"
+    ``city`` and single ``year`` values are added to the ``freetext`` query,
+    a ``year`` tuple ``(from_year, to_year)`` is a year range,
+    and other keys (e.g. ``title`` or ``doctype``) are passed on as they are.
 
-    return pd.concat([positive_counts, negative_counts, neutral_counts])
+    :param dict facet: e.g. ``{"city": "Bergen", "year": 2001}``
+    :param params: other ``dh.Corpus`` parameters shared by all facets
+    """
+    freetext = [params.pop("freetext")] if params.get("freetext") else []
+    for key, value in facet.items():
+        if key == "city" or (key == "year" and not isinstance(value, tuple)):
+            freetext.append(f"{key}: {value}")
+        elif key == "year":
+            params["from_year"], params["to_year"] = value
+        else:
+            params[key] = value
+    if freetext:
+        params["freetext"] = " ".join(freetext)
+    return params
+
+
+def facet_label(value):
+    """Label a facet value in the result index, e.g. a year range as ``"1999-2005"``."""
+    return "-".join(map(str, value)) if isinstance(value, tuple) else value
+
+
+def sentiment_by_facets(
+    word: str,
+    facets: dict,
+    limit: int = 1000,
+    workers: int = 8,
+    lexicon: Lexicon = None,
+    use_cache: bool = True,
+    **params,
+) -> pd.DataFrame:
+    """Compute the collocation sentiment of ``word`` in one corpus per combination of facet values.
+
+    The corpora and collocations are fetched concurrently,
+    within the rate limit of the shared ``DhlabClient``, and all facets share one lexicon.
+
+    :param str word: word to estimate sentiment scores for
+    :param dict facets: facet names and lists of values, e.g.
+        ``{"city": ["Bergen", "Molde"], "year": range(2000, 2010)}``, see ``facet_corpus_params``
+    :param int limit: max number of documents per corpus
+    :param int workers: max number of facets fetched at the same time
+    :param params: other ``dh.Corpus`` parameters shared by all facets, e.g. ``doctype="digavis"``
+    :return: a dataframe with ``positive``, ``negative`` and ``sum`` columns,
+        and the number of ``documents`` in each corpus, indexed by the facet values
+    """
+    lexicon = lexicon or load_lexicon()
+    names = list(facets)
+    combinations = list(itertools.product(*(facets[name] for name in names)))
+
+    def score_facet(values):
+        facet = dict(zip(names, values))
+        corpus = load_corpus(
+            use_cache=use_cache, **facet_corpus_params(facet, limit=limit, **params)
+        )
+        if corpus.empty:
+            return 0, 0, 0
+        coll = fetch_collocation(corpus.urn.to_list(), word, use_cache=use_cache)
+        pos, neg = coll_sentiment(coll, word, return_score_only=True, lexicon=lexicon)
+        return pos, neg, len(corpus)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        scores = list(pool.map(score_facet, combinations))
+
+    df = pd.DataFrame(
+        scores,
+        columns=["positive", "negative", "documents"],
+        index=pd.MultiIndex.from_tuples(
+            [tuple(map(facet_label, values)) for values in combinations], names=names
+        ),
+    )
+    df.insert(2, "sum", df.positive - df.negative)
+    return df
 
 
 def sentiment_by_place(
     cities=["Kristiansand", "Stavanger"],
     from_year=1999,
-    to_year=2010
+    to_year=2010,
+    word="barnevern",
 ):
+    """Yield the yearly collocation sentiment of ``word`` in newspapers, one city at a time.
 
+    See ``sentiment_by_facets`` for other facets than cities and years.
+    """
+    result = sentiment_by_facets(
+        word,
+        {"city": cities, "year": range(from_year, to_year)},
+        doctype="digavis",
+    )
     for city in cities:
-        lst = []
-        for year in range(from_year, to_year):
-            corpus = dh.Corpus(
-                doctype="digavis", freetext=f"city: {city} year: {year}", limit=1000
-            )
-            pos, neg = coll_sentiment(corpus, "barnevern", return_score_only=True)
-
-            lst.append(
-                pd.DataFrame(
-                    [[pos, neg, pos - neg]],
-                    index=[year],
-                    columns=["positive", "negative", "sum"],
-                )
-            )
-
-        yield pd.concat(lst)
+        yield result.loc[city, ["positive", "negative", "sum"]]
 
 
 def score_sentiment(text, positive, negative):
@@ -222,46 +1078,2001 @@ def score_sentiment(text, positive, negative):
     return sent_counts
 
 
-def count_and_score_target_words(corpus: pd.DataFrame, word: str):
-    """Add word frequency and sentiment score for ``word`` in the given ``corpus``."""
-    if isinstance(corpus, dh.Corpus):
+class LexiconMatcher:
+    """Count positive and negative lexicon terms in a text with a single scan.
+
+    The text is scanned with the pattern of the dhlab tokenizer,
+    so a hit is counted exactly where ``count_tokens`` would count a token,
+    but the tokens are looked up as they are matched,
+    without building token lists, counters or series.
+    """
+
+    def __init__(self, lexicon: Lexicon):
+        self.lexicon_version = lexicon.version
+        self.weights = {
+            term: (int(term in lexicon.positive), int(term in lexicon.negative))
+            for term in lexicon.positive | lexicon.negative
+        }
+        # count_tokens drops ellipses before matching
+        self.weights.pop("...", None)
+        self._pattern = import_tokenizer().regex
+
+    def count(self, text: str) -> Tuple[int, int]:
+        """Return the number of positive and negative terms in ``text``."""
+        positive = negative = 0
+        weights = self.weights
+        for match in self._pattern.finditer(strip_bold_annotation(text)):
+            hit = weights.get(match.group().lower())
+            if hit is not None:
+                positive += hit[0]
+                negative += hit[1]
+        return positive, negative
+
+    def count_windows(self, text: str, windows: List[int]) -> np.ndarray:
+        """Count the terms within each of ``windows`` tokens on either side of the keyword.
+
+        The keyword is the text in bold in ``text``. If there are several,
+        the one closest to the middle of the text is used.
+
+        :return: an array with one ``(positive, negative)`` row per window
+        """
+        text, spans = split_bold_annotation(text)
+        positive, negative = [0], [0]
+        keyword = []
+        weights = self.weights
+        for match in self._pattern.finditer(text):
+            token = match.group()
+            if token == "...":
+                continue
+            start = match.start()
+            span = next((i for i, (a, b) in enumerate(spans) if a <= start < b), None)
+            if span is not None:
+                keyword.append((span, len(positive) - 1))
+            pos, neg = weights.get(token.lower(), (0, 0))
+            positive.append(positive[-1] + pos)
+            negative.append(negative[-1] + neg)
+        n_tokens = len(positive) - 1
+        if keyword:
+            centre = min(
+                {span for span, _ in keyword},
+                key=lambda span: abs(spans[span][0] + spans[span][1] - len(text)),
+            )
+            first = min(i for span, i in keyword if span == centre)
+            last = max(i for span, i in keyword if span == centre)
+        else:
+            first = last = n_tokens // 2
+        counts = np.zeros((len(windows), 2), dtype=np.int64)
+        for k, window in enumerate(windows):
+            lo, hi = max(0, first - window), min(n_tokens, last + window + 1)
+            counts[k] = positive[hi] - positive[lo], negative[hi] - negative[lo]
+        return counts
+
+    def count_many(self, texts: List[str]) -> np.ndarray:
+        """Count the terms in every text.
+
+        :return: an array with one ``(positive, negative)`` row per text.
+        """
+        counts = np.zeros((len(texts), 2), dtype=np.int64)
+        for i, text in enumerate(texts):
+            counts[i] = self.count(text)
+        return counts
+
+
+def tokenize_snippets(texts: List[str]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Tokenize all ``texts`` once and map the lowercased tokens to integer ids.
+
+    :return: the snippet index and the vocabulary id of every token,
+        and the vocabulary as a list of tokens ordered by id.
+    """
+    tokenize = import_tokenizer().tokenize
+    vocab = {}
+    snippet_ids, token_ids = [], []
+    for i, text in enumerate(texts):
+        ids = [
+            vocab.setdefault(tok.lower(), len(vocab))
+            for tok in tokenize(strip_bold_annotation(text))
+            if not tok == "..."
+        ]
+        snippet_ids.extend([i] * len(ids))
+        token_ids.extend(ids)
+    return (
+        np.array(snippet_ids, dtype=np.int64),
+        np.array(token_ids, dtype=np.int64),
+        list(vocab),
+    )
+
+
+def score_snippets(texts: List[str], lexicon: Lexicon = None) -> pd.DataFrame:
+    """Count positive and negative terms in a batch of ``texts``.
+
+    The counts are the same as ``score_sentiment`` gives for each text,
+    but every text is scanned once by the ``LexiconMatcher`` of the lexicon.
+
+    :return: a dataframe with ``positive`` and ``negative`` counts, one row per text.
+    """
+    lexicon = lexicon or load_lexicon()
+    with stage("score", rows=len(texts)):
+        counts = lexicon.matcher.count_many(texts)
+        return pd.DataFrame(counts, columns=["positive", "negative"])
+
+
+def score_windows(texts: List[str], windows: List[int], lexicon: Lexicon = None) -> pd.DataFrame:
+    """Count positive and negative terms within several window sizes around the keyword of each text.
+
+    Each text is scanned once, and the counts for all ``windows`` are derived from it,
+    see ``LexiconMatcher.count_windows``. A window is counted in tokens on either side
+    of the keyword, so the texts must be fetched with a window at least as large as the largest one.
+
+    :return: a dataframe with ``positive_w<size>`` and ``negative_w<size>`` columns, one row per text.
+    """
+    lexicon = lexicon or load_lexicon()
+    counts = np.zeros((len(texts), len(windows), 2), dtype=np.int64)
+    with stage("windows", rows=len(texts)):
+        for i, text in enumerate(texts):
+            counts[i] = lexicon.matcher.count_windows(text, windows)
+    columns = {}
+    for k, window in enumerate(windows):
+        columns[f"positive_w{window}"] = counts[:, k, 0]
+        columns[f"negative_w{window}"] = counts[:, k, 1]
+    return pd.DataFrame(columns)
+
+
+# The lexicon of a scoring worker process, set once by the pool initializer
+_worker_lexicon = None
+
+
+def _init_scoring_worker(lexicon: Lexicon):
+    global _worker_lexicon
+    _worker_lexicon = lexicon
+
+
+def _score_chunk(texts: List[str]) -> pd.DataFrame:
+    return score_snippets(texts, _worker_lexicon)
+
+
+def scoring_pool(lexicon: Lexicon, workers: int) -> ProcessPoolExecutor:
+    """Start a pool of ``workers`` processes for ``score_snippets_parallel`` and ``TokenCounts.from_texts``.
+
+    The ``lexicon`` is sent to each process once, so create the pool once per run
+    and pass it to every batch.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_scoring_worker, initargs=(lexicon,)
+    )
+
+
+# Smaller chunks cost more to send to a worker process than to score in this process
+MIN_CHUNKSIZE = 100
+
+
+def split_chunks(texts: List[str], workers: int, chunksize: int) -> List[List[str]]:
+    """Split ``texts`` in chunks of at most ``chunksize`` texts for a pool of ``workers`` processes.
+
+    Fewer texts than ``workers * chunksize`` are spread over all the workers,
+    in chunks of at least ``MIN_CHUNKSIZE`` texts.
+    """
+    size = max(min(chunksize, -(-len(texts) // workers)), min(MIN_CHUNKSIZE, chunksize), 1)
+    return [texts[i : i + size] for i in range(0, len(texts), size)]
+
+
+def score_snippets_parallel(
+    texts: List[str],
+    lexicon: Lexicon = None,
+    workers: int = 1,
+    chunksize: int = 2000,
+    pool: Executor = None,
+) -> pd.DataFrame:
+    """Score ``texts`` like ``score_snippets``, sharded across a pool of processes.
+
+    The lexicon is sent to each worker process once,
+    and the chunks are merged back in the order of ``texts``.
+
+    :param int workers: number of processes, use ``os.cpu_count()`` for all cores.
+        With a single worker, or a single chunk, the texts are scored in this process.
+    :param int chunksize: max number of texts per chunk sent to a worker, see ``split_chunks``
+    :param pool: a pool from ``scoring_pool`` with the same lexicon,
+        otherwise a pool is started for this call
+    """
+    lexicon = lexicon or load_lexicon()
+    chunks = split_chunks(texts, workers, chunksize) if workers > 1 else [texts]
+    if len(chunks) <= 1:
+        return score_snippets(texts, lexicon)
+    with stage("tokenize+score", rows=len(texts)):
+        if pool is None:
+            with scoring_pool(lexicon, workers) as pool:
+                scores = list(pool.map(_score_chunk, chunks))
+        else:
+            scores = list(pool.map(_score_chunk, chunks))
+    return pd.concat(scores, ignore_index=True)
+
+
+class ScoreMemo:
+    """Memo of snippet scores, so that duplicated snippets are tokenized and scored once.
+
+    Newspaper corpora repeat wire-service and syndicated text in many editions.
+    A snippet is keyed by a hash of the lexicon version and the snippet without bold annotation,
+    in a bounded LRU dict in memory, and optionally in a SQLite table that persists across runs.
+    Whitespace and case are not normalized, since the tokenizer splits
+    abbreviations and numbers differently depending on them.
+
+    :param int max_entries: max number of snippets to keep in memory
+    :param path: SQLite database file to persist the scores in, or None to keep them in memory only
+    """
+
+    def __init__(self, max_entries: int = 200_000, path: Union[str, Path] = None):
+        self.max_entries = max_entries
+        self.path = None if path is None else Path(path)
+        self.snippets = 0
+        self.scored = 0
+        self.persisted_hits = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            with self._lock, self._db:
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS scores ("
+                    "key BLOB PRIMARY KEY, positive INTEGER, negative INTEGER)"
+                )
+
+    @staticmethod
+    def make_key(text: str, lexicon: Lexicon) -> bytes:
+        digest = hashlib.blake2b(lexicon.version.encode("utf-8"), digest_size=16)
+        digest.update(b"\0")
+        digest.update(strip_bold_annotation(text).encode("utf-8"))
+        return digest.digest()
+
+    def score(
+        self,
+        texts: List[str],
+        lexicon: Lexicon = None,
+        workers: int = 1,
+        chunksize: int = 2000,
+        pool: Executor = None,
+    ) -> pd.DataFrame:
+        """Score ``texts`` like ``score_snippets_parallel``, but only the snippets not seen before.
+
+        :return: a dataframe with ``positive`` and ``negative`` counts, one row per text.
+        """
+        lexicon = lexicon or load_lexicon()
+        keys = [self.make_key(text, lexicon) for text in texts]
+        scores = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memo:
+                    scores[key] = self._memo[key]
+                    self._memo.move_to_end(key)
+        missing = {key: text for key, text in zip(keys, texts) if key not in scores}
+        stored = self._read(list(missing)) if self._db is not None and missing else {}
+        new = {key: text for key, text in missing.items() if key not in stored}
+        if new:
+            counts = score_snippets_parallel(list(new.values()), lexicon, workers, chunksize, pool)
+            new = dict(zip(new, map(tuple, counts.to_numpy().tolist())))
+            if self._db is not None:
+                self._write(new)
+        scores.update(stored)
+        scores.update(new)
+        with self._lock:
+            for key in missing:
+                self._memo[key] = scores[key]
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+            self.snippets += len(keys)
+            self.scored += len(new)
+            self.persisted_hits += len(stored)
+        return pd.DataFrame([scores[key] for key in keys], columns=["positive", "negative"])
+
+    def _read(self, keys: List[bytes]) -> dict:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, positive, negative FROM scores WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                found.update((key, (positive, negative)) for key, positive, negative in rows)
+        return found
+
+    def _write(self, scores: dict):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                [(key, positive, negative) for key, (positive, negative) in scores.items()],
+            )
+
+    def stats(self) -> dict:
+        """Count the snippets looked up and scored, and the share of duplicates."""
+        with self._lock:
+            return {
+                "snippets": self.snippets,
+                "scored": self.scored,
+                "persisted_hits": self.persisted_hits,
+                "entries": len(self._memo),
+                "duplicate_rate": 1 - self.scored / self.snippets if self.snippets else 0.0,
+            }
+
+
+@dataclass(repr=False)
+class TokenCounts:
+    """Sparse counts of the lowercased tokens in a list of snippets.
+
+    Entry ``k`` says that snippet ``rows[k]`` has ``counts[k]`` of the token ``vocab[cols[k]]``,
+    like a sparse matrix in coordinate format, with one row per snippet and one column per token.
+    Scoring with a lexicon is a product of this matrix with a 0/1 vector over the vocabulary,
+    so any lexicon can be scored without fetching or tokenizing the snippets again.
+    """
+
+    rows: np.ndarray
+    cols: np.ndarray
+    counts: np.ndarray
+    vocab: List[str]
+    n_snippets: int
+
+    def __repr__(self):
+        return f"TokenCounts({self.n_snippets} snippets, {len(self.vocab)} tokens, {len(self.counts)} entries)"
+
+    @classmethod
+    def from_texts(
+        cls, texts: List[str], workers: int = 1, chunksize: int = 2000, pool: Executor = None
+    ) -> "TokenCounts":
+        """Tokenize and count the tokens of ``texts``, in a pool of ``workers`` processes if more than 1.
+
+        :param pool: a process pool to reuse, e.g. from ``scoring_pool``,
+            otherwise a pool is started for this call
+        """
+        chunks = split_chunks(texts, workers, chunksize) if workers > 1 else [texts]
+        if len(chunks) > 1:
+            if pool is None:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    return cls.concat(list(pool.map(cls.from_texts, chunks)))
+            return cls.concat(list(pool.map(cls.from_texts, chunks)))
+        snippet_ids, token_ids, vocab = tokenize_snippets(texts)
+        n_tokens = max(len(vocab), 1)
+        keys, counts = np.unique(snippet_ids * n_tokens + token_ids, return_counts=True)
+        return cls(
+            rows=(keys // n_tokens).astype(np.int32),
+            cols=(keys % n_tokens).astype(np.int32),
+            counts=counts.astype(np.int32),
+            vocab=vocab,
+            n_snippets=len(texts),
+        )
+
+    @classmethod
+    def concat(cls, parts: List["TokenCounts"]) -> "TokenCounts":
+        """Stack the snippets of ``parts`` in order, with a shared vocabulary."""
+        vocab = {}
+        rows, cols, counts = [np.zeros(0, np.int32)], [np.zeros(0, np.int32)], [np.zeros(0, np.int32)]
+        offset = 0
+        for part in parts:
+            ids = np.array([vocab.setdefault(tok, len(vocab)) for tok in part.vocab], dtype=np.int32)
+            rows.append(part.rows + offset)
+            cols.append(ids[part.cols])
+            counts.append(part.counts)
+            offset += part.n_snippets
+        return cls(
+            rows=np.concatenate(rows),
+            cols=np.concatenate(cols),
+            counts=np.concatenate(counts),
+            vocab=list(vocab),
+            n_snippets=offset,
+        )
+
+    @classmethod
+    def from_bags(cls, bags: List[dict]) -> "TokenCounts":
+        """Count the lowercased tokens of texts that are already counted, e.g. paragraphs from ``/chunks_para``.
+
+        :param bags: one dict of token counts per text
+        """
+        vocab = {}
+        rows = np.repeat(np.arange(len(bags), dtype=np.int64), [len(bag) for bag in bags])
+        cols = np.fromiter(
+            (vocab.setdefault(tok.lower(), len(vocab)) for bag in bags for tok in bag),
+            dtype=np.int64,
+            count=len(rows),
+        )
+        counts = np.fromiter(
+            (n for bag in bags for n in bag.values()), dtype=np.int64, count=len(rows)
+        )
+        n_tokens = max(len(vocab), 1)
+        # Tokens that only differ in case are summed up
+        keys, inverse = np.unique(rows * n_tokens + cols, return_inverse=True)
+        return cls(
+            rows=(keys // n_tokens).astype(np.int32),
+            cols=(keys % n_tokens).astype(np.int32),
+            counts=np.bincount(inverse, weights=counts).astype(np.int32),
+            vocab=list(vocab),
+            n_snippets=len(bags),
+        )
+
+    def token_ids(self, word: str) -> np.ndarray:
+        """Find the vocabulary ids of ``word``, or of all tokens with its prefix if it ends with ``*``."""
+        term = word.lower().rstrip("*")
+        if word.endswith("*"):
+            return np.flatnonzero([tok.startswith(term) for tok in self.vocab])
+        token_id = self.token_index.get(term)
+        return np.array([] if token_id is None else [token_id], dtype=np.int64)
+
+    @cached_property
+    def token_index(self) -> dict:
+        """The vocabulary id of each token."""
+        return {tok: i for i, tok in enumerate(self.vocab)}
+
+    def rows_with(self, word: str) -> np.ndarray:
+        """The rows where ``word`` occurs, see ``token_ids``."""
+        return np.unique(self.rows[np.isin(self.cols, self.token_ids(word))])
+
+    def lexicon_vector(self, terms: frozenset) -> np.ndarray:
+        """Mark the tokens of the vocabulary that are in ``terms``."""
+        return np.fromiter((tok in terms for tok in self.vocab), dtype=bool, count=len(self.vocab))
+
+    def score(self, lexicon: Lexicon = None) -> pd.DataFrame:
+        """Count positive and negative terms in each snippet, like ``score_snippets``."""
+        lexicon = lexicon or load_lexicon()
+        scores = {}
+        for column, terms in (("positive", lexicon.positive), ("negative", lexicon.negative)):
+            hits = self.lexicon_vector(terms)[self.cols]
+            scores[column] = np.bincount(
+                self.rows[hits], weights=self.counts[hits], minlength=self.n_snippets
+            ).astype(np.int64)
+        return pd.DataFrame(scores)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Store the counts in a compressed ``.npz`` file."""
+        path = Path(path)
+        np.savez_compressed(
+            path,
+            rows=self.rows,
+            cols=self.cols,
+            counts=self.counts,
+            vocab=np.frombuffer("\n".join(self.vocab).encode("utf-8"), dtype=np.uint8),
+            n_snippets=self.n_snippets,
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "TokenCounts":
+        with np.load(path) as data:
+            vocab = data["vocab"].tobytes().decode("utf-8")
+            return cls(
+                rows=data["rows"],
+                cols=data["cols"],
+                counts=data["counts"],
+                vocab=vocab.split("\n") if vocab else [],
+                n_snippets=int(data["n_snippets"]),
+            )
+
+
+def rescore(
+    df: pd.DataFrame, token_counts: TokenCounts, lexicon: Lexicon = None, suffix: str = ""
+) -> pd.DataFrame:
+    """Score the rows of ``df`` with ``lexicon``, from the token counts of their ``snippet``.
+
+    :param df: the result and token counts of
+        ``count_and_score_target_words(..., return_token_counts=True)``
+    :param str suffix: added to the names of the score columns,
+        e.g. to keep the scores of several lexicons side by side
+    """
+    scores = token_counts.score(lexicon).to_numpy()[df.snippet.to_numpy()]
+    return df.assign(
+        **{
+            f"positive{suffix}": scores[:, 0],
+            f"negative{suffix}": scores[:, 1],
+            f"sentimentscore{suffix}": scores[:, 0] - scores[:, 1],
+        }
+    )
+
+
+def compare_lexicons(df: pd.DataFrame, token_counts: TokenCounts, lexicons: dict) -> pd.DataFrame:
+    """Score the rows of ``df`` with several lexicons side by side, see ``rescore``.
+
+    :param dict lexicons: lexicons by name, the score columns of each lexicon
+        get the suffix ``_<name>``
+    """
+    for name, lexicon in lexicons.items():
+        df = rescore(df, token_counts, lexicon, suffix=f"_{name}")
+    return df
+
+
+def fetch_paragraphs(urn: str, use_cache: bool = True) -> List[dict]:
+    """Fetch the token counts of each paragraph in the document ``urn``.
+
+    Same request as ``dhlab.api.dhlab_api.get_chunks_para``, sent with the shared ``DhlabClient``.
+    A document that the API can't answer for is logged as a warning and has no paragraphs.
+    """
+    try:
+        paragraphs = get_client().get("chunks_para", {"urn": urn}, use_cache=use_cache)
+    except requests.HTTPError as e:
+        logging.warning(f"Couldn't fetch the paragraphs of {urn}: {e}")
+        return []
+    return paragraphs if isinstance(paragraphs, list) else []
+
+
+@dataclass(repr=False)
+class ParagraphCounts:
+    """Sparse token counts of the paragraphs of several documents.
+
+    ``tokens`` has one row per paragraph, and a vocabulary shared by all the documents.
+    Paragraph ``i`` is in the document ``urns[documents[i]]``.
+    """
+
+    tokens: TokenCounts
+    documents: np.ndarray
+    urns: List[str]
+
+    def __repr__(self):
+        return f"ParagraphCounts({len(self.urns)} documents, {self.tokens!r})"
+
+    @classmethod
+    def fetch(cls, urns: List[str], workers: int = 8, use_cache: bool = True) -> "ParagraphCounts":
+        """Fetch the paragraphs of ``urns``, with at most ``workers`` requests at the same time."""
+        with stage("paragraphs") as record, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                submit_in_context(pool, fetch_paragraphs, urn, use_cache) for urn in urns
+            ]
+            paragraphs = [future.result() for future in futures]
+            tokens = TokenCounts.from_bags([bag for bags in paragraphs for bag in bags])
+            record["rows"] = tokens.n_snippets
+        documents = np.repeat(np.arange(len(urns), dtype=np.int32), list(map(len, paragraphs)))
+        return cls(tokens=tokens, documents=documents, urns=list(urns))
+
+    def context(self, word: str) -> pd.DataFrame:
+        """Sum up the token counts of the paragraphs where ``word`` occurs.
+
+        :return: a dataframe with a ``counts`` column, indexed by alphabetic terms
+        """
+        tokens = self.tokens
+        in_context = np.isin(tokens.rows, tokens.rows_with(word))
+        counts = np.bincount(
+            tokens.cols[in_context], weights=tokens.counts[in_context], minlength=len(tokens.vocab)
+        ).astype(np.int64)
+        context = pd.Series(counts, index=tokens.vocab, name="counts")
+        context = context[(counts > 0) & context.index.str.isalpha()]
+        return context.sort_index().to_frame()
+
+    def score(self, word: str, lexicon: Lexicon = None) -> pd.DataFrame:
+        """Count positive and negative terms in each document, in the paragraphs where ``word`` occurs.
+
+        :return: a dataframe with the ``urn``, the number of ``paragraphs`` with the word,
+            and the ``positive``, ``negative`` and ``sentimentscore`` of each document
+            where the word occurs
+        """
+        rows = self.tokens.rows_with(word)
+        scores = self.tokens.score(lexicon).to_numpy()[rows]
+        documents = self.documents[rows]
+        n_documents = len(self.urns)
+        df = pd.DataFrame(
+            {
+                "urn": self.urns,
+                "paragraphs": np.bincount(documents, minlength=n_documents),
+                "positive": np.bincount(documents, scores[:, 0], n_documents).astype(np.int64),
+                "negative": np.bincount(documents, scores[:, 1], n_documents).astype(np.int64),
+            }
+        )
+        df["sentimentscore"] = df.positive - df.negative
+        return df[df.paragraphs > 0].reset_index(drop=True)
+
+
+def count_and_score_paragraphs(
+    corpus: pd.DataFrame,
+    words: List[str],
+    lexicon: Lexicon = None,
+    workers: int = 8,
+    use_cache: bool = True,
+) -> pd.DataFrame:
+    """Compute sentiment scores of the paragraphs where ``words`` occur, instead of concordance windows.
+
+    Each document is fetched once, and each word is looked up in the shared vocabulary.
+
+    :param corpus: a dh.Corpus or a corpus dataframe with a ``urn`` column
+    :param words: words to score, a word ending with ``*`` matches any word with that prefix
+    :param int workers: max number of documents fetched at the same time
+    :return: the corpus metadata with a ``word``, the number of ``paragraphs`` with the word,
+        and the ``positive``, ``negative`` and ``sentimentscore`` of those paragraphs,
+        one row per document and word
+    """
+    if is_corpus(corpus):
         corpus = corpus.frame
+    lexicon = lexicon or load_lexicon()
+    paragraphs = ParagraphCounts.fetch(corpus.urn.to_list(), workers=workers, use_cache=use_cache)
+    with stage("score", rows=paragraphs.tokens.n_snippets):
+        scores = [paragraphs.score(word, lexicon).assign(word=word) for word in make_list(words)]
+        df = corpus.merge(pd.concat(scores, ignore_index=True), on="urn")
+    return compact_frame(df)
 
-    urnlist = corpus.urn.to_list()
-    limit = 60 * len(urnlist)
-    docid_column = "dhlabid"
 
-    conc = concordance(urnlist, word, window=200, limit=limit)
+def fetch_concordances(
+    urns: List[str],
+    word: str,
+    window: int = 200,
+    docid_column: str = "dhlabid",
+    use_cache: bool = True,
+    limit: int = None,
+) -> pd.DataFrame:
+    """Fetch concordances for ``word`` with a ``docid_column`` and a ``conc`` column.
+
+    Same request as ``dhlab.api.dhlab_api.concordance``, sent with the shared ``DhlabClient``.
+
+    :param str word: word or fulltext query, e.g. ``"skole OR sykehus"``
+    :param int limit: max number of concordances, defaults to 60 per document
+    """
+    limit = limit or 60 * len(urns)
+    params = {"urns": urns, "query": word, "window": window, "limit": limit}
+    with stage("concordance") as record:
+        conc = pd.DataFrame(get_client().post("conc", params, use_cache=use_cache))
+        record["rows"] = len(conc)
+    if conc.empty:
+        return pd.DataFrame(columns=[docid_column, "conc"])
     # FIXME: remove once concordance also returns dhlabid by default
-    conc = conc.rename(columns={"docid": docid_column}).drop("urn", axis=1)
+    return conc.rename(columns={"docid": docid_column}).drop("urn", axis=1)
+
+
+def match_keywords(conc: pd.DataFrame, words: List[str]) -> pd.DataFrame:
+    """Add a ``word`` column with the keywords marked in bold in each concordance.
 
-    word_freq = count_terms_in_doc(urnlist, [word])
-    word_freq = word_freq.merge(
-        conc, how="inner", left_on=docid_column, right_on=docid_column
+    A concordance with several of the ``words`` in bold is repeated once per keyword,
+    and keywords ending with ``*`` match any word with that prefix.
+    """
+    patterns = [(w, w.lower().rstrip("*"), w.endswith("*")) for w in words]
+
+    def keywords(text):
+        bold = {t.lower() for t in re.findall(r"<b>(.*?)</b>", text)}
+        return [
+            w
+            for w, term, is_prefix in patterns
+            if any(b.startswith(term) if is_prefix else b == term for b in bold)
+        ]
+
+    conc = conc.assign(word=conc.conc.map(keywords)).explode("word")
+    return conc.dropna(subset=["word"])
+
+
+def merge_concordances(
+    word_freq: pd.DataFrame, conc: pd.DataFrame, words: List[str], docid_column: str = "dhlabid"
+) -> pd.DataFrame:
+    """Merge the concordances with the frequencies of the keywords in their documents."""
+    if len(words) == 1:
+        return word_freq.merge(conc, how="inner", on=docid_column)
+    return word_freq.merge(match_keywords(conc, words), how="inner", on=[docid_column, "word"])
+
+
+@dataclass
+class ConcordancePlan:
+    """Batches of the documents that contain the keywords, sized from the keyword frequencies.
+
+    Made by ``plan_concordances``. The fetched, refetched and truncated counters are updated
+    by ``fetch``, and summed up by ``summary``.
+    """
+
+    word: Union[str, List[str]]
+    word_freq: pd.DataFrame
+    batches: List[pd.DataFrame]
+    limits: List[int]
+    documents: int
+    docid_column: str = "dhlabid"
+    max_concordances: int = 20_000
+    fetched: int = 0
+    refetched: int = 0
+    truncated: List[int] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def fetch(self, i: int, window: int = 200, use_cache: bool = True) -> pd.DataFrame:
+        """Fetch the concordances of batch ``i``, merged with the keyword frequencies.
+
+        A request that gets as many concordances as its limit may be truncated,
+        so it is sent again with twice the limit, up to ``max_concordances``,
+        and then split in two halves of the documents. Only a single document with more
+        than ``max_concordances`` concordances is left truncated; it is logged as a warning
+        and its batch is counted in ``truncated``.
+        """
+        batch = self.batches[i]
+        urns, limit = batch.urn.to_list(), self.limits[i]
+        conc, truncated = self._fetch_complete(urns, limit, window, use_cache)
+        with self._lock:
+            self.fetched += len(conc)
+            if truncated:
+                self.truncated.append(i)
+        if truncated:
+            logging.warning(
+                f"Concordances for {self.word!r} in batch {i} may be truncated: "
+                f"a document has more than {self.max_concordances} concordances"
+            )
+        docids = self.word_freq[self.docid_column]
+        word_freq = self.word_freq.loc[docids.isin(batch[self.docid_column])]
+        return merge_concordances(word_freq, conc, make_list(self.word), self.docid_column)
+
+    def _fetch_complete(self, urns: List[str], limit: int, window: int, use_cache: bool):
+        query = " OR ".join(make_list(self.word))
+        while True:
+            conc = fetch_concordances(urns, query, window, self.docid_column, use_cache, limit)
+            if len(conc) < limit:
+                return conc, False
+            with self._lock:
+                self.refetched += 1
+            if limit < self.max_concordances:
+                limit = min(self.max_concordances, 2 * limit)
+            elif len(urns) > 1:
+                half = len(urns) // 2
+                parts = [
+                    self._fetch_complete(part, limit, window, use_cache)
+                    for part in (urns[:half], urns[half:])
+                ]
+                conc = pd.concat([part for part, _ in parts], ignore_index=True)
+                return conc, any(truncated for _, truncated in parts)
+            else:
+                return conc, True
+
+    def summary(self) -> dict:
+        return {
+            "documents": self.documents,
+            "documents_with_hits": sum(len(batch) for batch in self.batches),
+            "batches": len(self.batches),
+            "expected_concordances": int(self.word_freq["count"].sum()),
+            "concordance_limit": int(sum(self.limits)),
+            "fetched_concordances": self.fetched,
+            "refetched_requests": self.refetched,
+            "truncated_batches": len(self.truncated),
+        }
+
+
+def plan_concordances(
+    corpus: pd.DataFrame,
+    word: Union[str, List[str]],
+    batch_size: int = 1000,
+    max_concordances: int = 20_000,
+    overfetch: float = 1.5,
+    docid_column: str = "dhlabid",
+    use_cache: bool = True,
+) -> ConcordancePlan:
+    """Get the frequencies of ``word`` in every document first, and plan the concordance requests.
+
+    Documents without the keywords are dropped.
+    The others are grouped, in corpus order, into batches of at most ``batch_size`` documents
+    and at most ``max_concordances`` expected concordances,
+    and each batch gets a concordance limit of ``overfetch`` times its expected concordances.
+    A single document with more than ``max_concordances`` hits gets a batch of its own,
+    and will be reported as truncated.
+    A frequency request that fails raises, so no document is planned as without hits by mistake.
+
+    :param int batch_size: number of documents per request
+    :param float overfetch: margin for concordances that the frequencies don't count,
+        e.g. capitalized forms of the keyword
+    """
+    if is_corpus(corpus):
+        corpus = corpus.frame
+    words = make_list(word)
+    urn_batches = [
+        corpus.urn.iloc[i : i + batch_size].to_list() for i in range(0, len(corpus), batch_size)
+    ]
+    # a failed frequency request must not make its documents look like they have no hits
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [
+            submit_in_context(
+                pool, count_terms_in_doc, urns, words, docid_column, use_cache, strict=True
+            )
+            for urns in urn_batches
+        ]
+        frequencies = [future.result() for future in futures]
+
+    with stage("plan") as record:
+        word_freq = pd.concat(frequencies, ignore_index=True) if frequencies else None
+        if word_freq is None or word_freq.empty:
+            word_freq = pd.DataFrame(columns=[docid_column, "word", "count"])
+        word_freq = word_freq.loc[word_freq["count"] > 0]
+        expected = word_freq.groupby(docid_column)["count"].sum()
+        hits = corpus.loc[corpus[docid_column].isin(expected.index)]
+        counts = expected.reindex(hits[docid_column]).to_numpy()
+
+        batches, limits = [], []
+        start, total = 0, 0
+        for end, count in enumerate(counts):
+            if end > start and (end - start == batch_size or total + count > max_concordances):
+                batches.append(hits.iloc[start:end])
+                limits.append(min(max_concordances, int(np.ceil(total * overfetch))))
+                start, total = end, 0
+            total += count
+        if start < len(hits):
+            batches.append(hits.iloc[start:])
+            limits.append(min(max_concordances, int(np.ceil(total * overfetch))))
+        record["rows"] = len(hits)
+
+    logging.info(
+        f"Planned {len(batches)} concordance requests for {len(hits)} of {len(corpus)} documents"
+    )
+    return ConcordancePlan(
+        word=word,
+        word_freq=word_freq,
+        batches=batches,
+        limits=limits,
+        documents=len(corpus),
+        docid_column=docid_column,
+        max_concordances=max_concordances,
     )
 
-    pos, neg = load_norsentlex()
 
-    word_freq[["positive", "negative"]] = word_freq.apply(
-        lambda x: score_sentiment(x.conc, pos, neg), axis=1, result_type="expand"
+async def afetch_batches(
+    plan: "ConcordancePlan", window: int = 200, use_cache: bool = True
+) -> List[pd.DataFrame]:
+    """Asyncio variant of ``ConcordancePlan.fetch`` for all the batches of a ``plan`` at once.
+
+    Concurrency is bounded by ``DhlabClient.max_connections``.
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                None, partial(contextvars.copy_context().run, plan.fetch, i, window, use_cache)
+            )
+            for i in range(len(plan.batches))
+        )
     )
+
+
+def result_columns(corpus_columns: List[str], windows: List[int] = None) -> List[str]:
+    """Get the columns of the result of an analysis of a corpus with ``corpus_columns``."""
+    columns = [*corpus_columns, "word", "count", "positive", "negative", "sentimentscore"]
+    for window in windows or []:
+        columns += [f"positive_w{window}", f"negative_w{window}", f"sentimentscore_w{window}"]
+    return columns
+
+
+def score_batch(
+    corpus: pd.DataFrame,
+    word_freq: pd.DataFrame,
+    lexicon: Lexicon = None,
+    workers: int = 1,
+    chunksize: int = 2000,
+    docid_column: str = "dhlabid",
+    return_token_counts: bool = False,
+    windows: List[int] = None,
+    memo: ScoreMemo = None,
+    pool: Executor = None,
+):
+    """Score the concordances in ``word_freq`` and merge the scores with the ``corpus`` metadata.
+
+    Each distinct concordance text is tokenized and scored once,
+    and the merged frame is stored with the compact dtypes of ``compact_frame``.
+
+    :param bool return_token_counts: if True, also return the ``TokenCounts`` of the distinct
+        concordances, and add a ``snippet`` column with the row of each concordance in it.
+    :param windows: window sizes to score within as well, see ``score_windows``.
+        The scores are added in ``positive_w<size>``, ``negative_w<size>``
+        and ``sentimentscore_w<size>`` columns.
+    :param memo: a ``ScoreMemo`` to look up and store the scores of the concordances in,
+        so concordances seen in earlier batches or runs are not scored again.
+        It is not used for the token counts.
+    :param pool: a pool from ``scoring_pool`` to score with, shared by the batches of a run
+    """
+    codes, texts = pd.factorize(word_freq.conc)
+    if return_token_counts:
+        with stage("tokenize", rows=len(texts)):
+            token_counts = TokenCounts.from_texts(
+                list(texts), workers=workers, chunksize=chunksize, pool=pool
+            )
+        with stage("score", rows=len(texts)):
+            scores = token_counts.score(lexicon).to_numpy()[codes]
+    elif memo is not None:
+        scores = memo.score(
+            word_freq.conc.tolist(), lexicon, workers=workers, chunksize=chunksize, pool=pool
+        )
+        scores = scores.to_numpy()
+    else:
+        scores = score_snippets_parallel(
+            list(texts), lexicon, workers=workers, chunksize=chunksize, pool=pool
+        )
+        scores = scores.to_numpy()[codes]
+    word_freq = word_freq.drop(columns="conc")
+    if return_token_counts:
+        word_freq["snippet"] = codes
+    word_freq[["positive", "negative"]] = scores
     word_freq["sentimentscore"] = word_freq["positive"] - word_freq["negative"]
+    if windows:
+        window_scores = score_windows(list(texts), windows, lexicon)
+        for window in windows:
+            positive = window_scores[f"positive_w{window}"].to_numpy()[codes]
+            negative = window_scores[f"negative_w{window}"].to_numpy()[codes]
+            word_freq[f"positive_w{window}"] = positive
+            word_freq[f"negative_w{window}"] = negative
+            word_freq[f"sentimentscore_w{window}"] = positive - negative
+
+    with stage("merge") as record:
+        df = corpus.merge(word_freq, how="inner", on=docid_column)
+        df = compact_frame(df)
+        record["rows"] = len(df)
+    return (df, token_counts) if return_token_counts else df
+
+
+def iter_sentiment_batches(
+    corpus: pd.DataFrame,
+    word: Union[str, List[str]],
+    batch_size: int = 1000,
+    lexicon: Lexicon = None,
+    workers: int = 1,
+    chunksize: int = 2000,
+    window: int = 200,
+    use_cache: bool = True,
+    skip_empty: bool = True,
+    progress=None,
+    return_token_counts: bool = False,
+    windows: List[int] = None,
+    plan: ConcordancePlan = None,
+    max_concordances: int = 20_000,
+    memo: ScoreMemo = None,
+    pool: Executor = None,
+) -> Generator[pd.DataFrame, None, None]:
+    """Fetch, score and yield the sentiment of ``word`` in ``corpus``, one batch of documents at a time.
+
+    The keyword frequencies are fetched first, and only the documents with hits
+    are fetched concordances for, in batches planned by ``plan_concordances``.
+    The next batch is fetched in a background thread while the current batch is scored,
+    so at most two batches are held in memory.
+    Batches without any concordances are skipped, unless ``skip_empty`` is False.
+
+    :param corpus: a dh.Corpus or a corpus dataframe with ``urn`` and ``dhlabid`` columns
+    :param int batch_size: max number of documents per request to the API
+    :param int window: size of the concordance window around ``word``
+    :param bool use_cache: if False, bypass the response cache, see ``ResponseCache``
+    :param progress: optional callback, called with the number of documents with hits done
+        and the total number of documents with hits after each batch
+    :param bool return_token_counts: if True, yield each batch with its ``TokenCounts``,
+        see ``score_batch``
+    :param windows: smaller window sizes to score within as well, derived from the
+        concordances fetched with ``window``, see ``score_batch``
+    :param plan: the planned batches of ``corpus`` and ``word``, made here if not given
+    :param int max_concordances: max number of concordances per request, see ``plan_concordances``
+    :param memo: a ``ScoreMemo`` to score each distinct concordance once across batches
+    :param pool: a pool from ``scoring_pool`` with the same lexicon. With more than one worker
+        and no pool, a pool is started once for all the batches.
+    """
+    check_windows(window, windows)
+    if is_corpus(corpus):
+        corpus = corpus.frame
+    lexicon = lexicon or load_lexicon()
+    if plan is None:
+        plan = plan_concordances(
+            corpus,
+            word,
+            batch_size=batch_size,
+            max_concordances=max_concordances,
+            use_cache=use_cache,
+        )
+    batches = plan.batches
+    done = np.cumsum([len(batch) for batch in batches])
+
+    def prefetch(i):
+        return submit_in_context(prefetcher, plan.fetch, i, window, use_cache)
+
+    with ExitStack() as stack:
+        prefetcher = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+        if pool is None and workers > 1 and batches:
+            pool = stack.enter_context(scoring_pool(lexicon, workers))
+        future = prefetch(0) if batches else None
+        for i, batch in enumerate(batches):
+            word_freq = future.result()
+            if i + 1 < len(batches):
+                future = prefetch(i + 1)
+            if not (skip_empty and word_freq.empty):
+                yield score_batch(
+                    batch,
+                    word_freq,
+                    lexicon,
+                    workers=workers,
+                    chunksize=chunksize,
+                    return_token_counts=return_token_counts,
+                    windows=windows,
+                    memo=memo,
+                    pool=pool,
+                )
+            if progress is not None:
+                progress(int(done[i]), int(done[-1]))
+
 
-    df = corpus.merge(
-        word_freq.drop(columns="conc"),
-        how="inner",
-        left_on=docid_column,
-        right_on=docid_column,
+def check_windows(window: int, windows: List[int] = None):
+    """Raise a ValueError if any of ``windows`` is larger than the concordance ``window``.
+
+    The smaller windows are cut from the concordances fetched with ``window``,
+    so a larger one would either be truncated or widen the main scores.
+    """
+    larger = [size for size in windows or [] if size > window]
+    if larger:
+        raise ValueError(
+            f"The windows {', '.join(map(str, larger))} are larger than the concordance window {window}"
+        )
+
+
+def checkpoint_path(
+    checkpoint_dir: Union[str, Path],
+    word: Union[str, List[str]],
+    lexicon: Lexicon,
+    window: int = 200,
+    windows: List[int] = None,
+    max_concordances: int = 20_000,
+) -> Path:
+    """Get the checkpoint directory of a run.
+
+    The directory is keyed by ``word``, lexicon version, window sizes and ``max_concordances``,
+    since batches truncated at ``max_concordances`` are checkpointed as they are.
+    """
+    name = re.sub(r"[^\w-]+", "_", ",".join(make_list(word)))
+    sizes = "-".join(str(w) for w in [window, *(windows or [])])
+    return Path(checkpoint_dir) / f"{name}-{lexicon.version}-w{sizes}-c{max_concordances}"
+
+
+def iter_checkpointed_batches(
+    corpus: pd.DataFrame,
+    word: Union[str, List[str]],
+    checkpoint_dir: Union[str, Path],
+    batch_size: int = 1000,
+    lexicon: Lexicon = None,
+    window: int = 200,
+    windows: List[int] = None,
+    max_concordances: int = 20_000,
+    **kwargs,
+) -> Generator[pd.DataFrame, None, ConcordancePlan]:
+    """Like ``iter_sentiment_batches``, but each scored batch is checkpointed to a parquet file.
+
+    Results for documents that are already checkpointed are read from disk and yielded first.
+    Only the ``dhlabid`` s that have not been seen before are fetched and scored,
+    so an interrupted run resumes after the last good batch,
+    and a rerun on an extended corpus only scores the new documents.
+    Batches that are truncated after the refetches of ``ConcordancePlan.fetch``
+    are checkpointed as they are, since a rerun would fetch the same concordances.
+
+    :param checkpoint_dir: directory for the checkpoints of all runs,
+        see ``checkpoint_path``
+    :param kwargs: other arguments to ``iter_sentiment_batches``
+    :raises ValueError: if the manifest of the checkpoint has other options than this run
+    :return: the ``ConcordancePlan`` of the documents that were not checkpointed,
+        as the value of the ``StopIteration`` when the batches are exhausted
+    """
+    check_windows(window, windows)
+    if is_corpus(corpus):
+        corpus = corpus.frame
+    lexicon = lexicon or load_lexicon()
+    path = checkpoint_path(checkpoint_dir, word, lexicon, window, windows, max_concordances)
+    path.mkdir(parents=True, exist_ok=True)
+    manifest_file = path / "manifest.json"
+    # compared with the manifest as they are read back from json, e.g. tuples as lists
+    options = json.loads(
+        json.dumps(
+            {
+                "word": word,
+                "lexicon": lexicon.version,
+                "window": window,
+                "windows": windows,
+                "max_concordances": max_concordances,
+            }
+        )
+    )
+    manifest = (
+        json.loads(manifest_file.read_text())
+        if manifest_file.exists()
+        else {**options, "batches": []}
     )
-    df = strip_empty_cols(df)
+    changed = [key for key, value in options.items() if manifest.get(key) != value]
+    if changed:
+        raise ValueError(
+            f"The checkpoint in {path} was made with other {', '.join(changed)}, "
+            "use another checkpoint_dir"
+        )
+
+    done = set()
+    for part in manifest["batches"]:
+        done.update(part["dhlabids"])
+        if part["file"] is not None:
+            df = pd.read_parquet(path / part["file"])
+            df = df.loc[df.dhlabid.isin(corpus.dhlabid)]
+            if not df.empty:
+                yield df.reset_index(drop=True)
+
+    remaining = corpus.loc[~corpus.dhlabid.isin(done)]
+    logging.info(f"Resuming {path}: {len(done)} documents checkpointed, {len(remaining)} to score")
+
+    def add_part(dhlabids: list, df: pd.DataFrame = None):
+        part = {"file": None, "dhlabids": dhlabids}
+        if df is not None and not df.empty:
+            part["file"] = f"part-{len(manifest['batches']):05d}.parquet"
+            df.to_parquet(path / part["file"], index=False)
+        manifest["batches"].append(part)
+        tmp_file = manifest_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(manifest))
+        os.replace(tmp_file, manifest_file)
+
+    plan = plan_concordances(
+        remaining,
+        word,
+        batch_size=batch_size,
+        max_concordances=max_concordances,
+        use_cache=kwargs.get("use_cache", True),
+    )
+    # documents without the keywords are done without fetching anything
+    without_hits = remaining.dhlabid.loc[~remaining.dhlabid.isin(plan.word_freq.dhlabid)]
+    if len(without_hits):
+        add_part(without_hits.tolist())
+    batches = iter_sentiment_batches(
+        remaining,
+        word,
+        batch_size=batch_size,
+        lexicon=lexicon,
+        window=window,
+        windows=windows,
+        skip_empty=False,
+        plan=plan,
+        **kwargs,
+    )
+    for batch, df in zip(plan.batches, batches):
+        add_part(batch.dhlabid.tolist(), df)
+        if not df.empty:
+            yield df
+    return plan
+
+
+def count_and_score_target_words(
+    corpus: pd.DataFrame,
+    word: Union[str, List[str]],
+    lexicon: Lexicon = None,
+    workers: int = 1,
+    chunksize: int = 2000,
+    batch_size: int = 1000,
+    use_cache: bool = True,
+    checkpoint_dir: Union[str, Path] = None,
+    progress=None,
+    return_token_counts: bool = False,
+    window: int = 200,
+    windows: List[int] = None,
+    max_concordances: int = 20_000,
+    memo: ScoreMemo = None,
+    pool: Executor = None,
+):
+    """Add word frequency and sentiment score for ``word`` in the given ``corpus``.
+
+    :param word: a keyword, or a list of keywords to analyse in a single pass.
+        The result has one row per concordance and keyword, see the ``word`` column.
+    :param lexicon: sentiment lexicon to score with, defaults to NorSentLex.
+    :param int workers: number of processes to score the concordances with,
+        started once for the run.
+    :param int chunksize: max number of concordances per process pool task.
+    :param int batch_size: max number of documents to fetch concordances for per request,
+        see ``iter_sentiment_batches``.
+    :param bool use_cache: if False, bypass the cached API responses and store fresh ones.
+    :param checkpoint_dir: if given, checkpoint each batch and resume from earlier runs,
+        see ``iter_checkpointed_batches``.
+    :param progress: optional callback, called with the number of documents done
+        and the total after each batch. With a ``checkpoint_dir``,
+        only the documents that are not checkpointed are counted.
+    :param bool return_token_counts: if True, return the result together with the
+        ``TokenCounts`` of its concordances, and a ``snippet`` column with the row
+        of each concordance in them. Use ``rescore`` or ``compare_lexicons`` to score
+        the result with other lexicons, without fetching or tokenizing again.
+        Not supported with a ``checkpoint_dir``.
+    :param int window: number of tokens on either side of ``word`` in the concordances.
+    :param windows: window sizes to score within as well, e.g. ``[5, 10, 25]``,
+        in ``positive_w<size>``, ``negative_w<size>`` and ``sentimentscore_w<size>`` columns,
+        each at most ``window``. The concordances are fetched once, with ``window``,
+        and the smaller windows are cut from them around the keyword in bold.
+    :param int max_concordances: max number of concordances per request,
+        see ``plan_concordances``.
+    :param memo: a ``ScoreMemo`` to look up and store the scores of the concordances in,
+        e.g. one with a ``path`` to reuse scores across runs. Defaults to a memo in memory
+        for this run, so each distinct concordance is scored once.
+    :param pool: a pool from ``scoring_pool`` to score with, e.g. to share it between runs.
+    :return: a dataframe with the time, rows, bytes and memory used by each stage
+        in ``df.attrs["metrics"]``, see ``PipelineMetrics``, and the number of documents
+        with hits and of expected, fetched and possibly truncated concordances
+        in ``df.attrs["plan"]``, see ``ConcordancePlan.summary``
+        (with a ``checkpoint_dir``, of the documents that were not checkpointed),
+        and the share of duplicated concordances in ``df.attrs["memo"]``, see ``ScoreMemo.stats``.
+    """
+    if is_corpus(corpus):
+        corpus = corpus.frame
+    if return_token_counts and checkpoint_dir is not None:
+        raise ValueError("Token counts are not checkpointed, use checkpoint_dir or return_token_counts")
+    check_windows(window, windows)
+    memo = memo or ScoreMemo()
+
+    options = dict(
+        batch_size=batch_size,
+        lexicon=lexicon,
+        workers=workers,
+        chunksize=chunksize,
+        use_cache=use_cache,
+        progress=progress,
+        window=window,
+        windows=windows,
+        max_concordances=max_concordances,
+        memo=memo,
+        pool=pool,
+    )
+    with collect_metrics() as metrics:
+        if checkpoint_dir is not None:
+            batches = []
+            checkpointed = iter_checkpointed_batches(corpus, word, checkpoint_dir, **options)
+            while True:
+                try:
+                    batches.append(next(checkpointed))
+                except StopIteration as stop:
+                    plan = stop.value
+                    break
+        else:
+            plan = plan_concordances(
+                corpus,
+                word,
+                batch_size=batch_size,
+                max_concordances=max_concordances,
+                use_cache=use_cache,
+            )
+            batches = list(
+                iter_sentiment_batches(
+                    corpus, word, return_token_counts=return_token_counts, plan=plan, **options
+                )
+            )
+        if return_token_counts:
+            batches, parts = [list(b) for b in zip(*batches)] or ([], [])
+            offsets = np.cumsum([0] + [part.n_snippets for part in parts])
+            batches = [
+                df.assign(snippet=df.snippet.astype(np.int64) + offset)
+                for df, offset in zip(batches, offsets)
+            ]
+        with stage("concat") as record:
+            if not batches:
+                df = pd.DataFrame(columns=result_columns(corpus.columns, windows))
+            else:
+                df = concat_compact(batches)
+            record["rows"] = len(df)
+    df.attrs["metrics"] = metrics.to_dict()
+    df.attrs["plan"] = plan.summary()
+    df.attrs["memo"] = memo.stats()
+    if return_token_counts:
+        return df, TokenCounts.concat(parts)
     return df
 
 
-def compute_sentiment_analysis(*args, **kwargs):
-    """Compute sentiment score on the input data."""
+def compute_sentiment_analysis(*args, target_width: float = None, **kwargs):
+    """Compute sentiment score on the input data.
+
+    Takes the same arguments as ``count_and_score_target_words``,
+    e.g. ``workers=os.cpu_count()`` to score in parallel.
+
+    :param float target_width: if given, only score a sample of the documents in each year,
+        and return the estimated scores per year together with the result, see ``sample_sentiment``
+    """
+    if target_width is not None:
+        return sample_sentiment(*args, target_width=target_width, **kwargs)
     return count_and_score_target_words(*args, **kwargs)
 
 
+# Sampling
+def estimate_strata(
+    values: pd.DataFrame, sizes: pd.Series, strata: List[str], confidence: float = 0.95
+) -> pd.DataFrame:
+    """Estimate the mean and total sentiment score per document in each stratum from a sample.
+
+    :param values: the ``sentimentscore`` of each sampled document and ``word``,
+        with the ``strata`` columns
+    :param sizes: the number of documents in each stratum, indexed by the ``strata``
+    :param float confidence: confidence level of the intervals
+    :return: a dataframe indexed by ``word`` and the ``strata``, with the number of ``documents``
+        and ``sampled`` documents, and the ``mean`` and ``total`` score with their confidence
+        intervals, ``mean_low``, ``mean_high``, ``total_low`` and ``total_high``
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    df = values.groupby(["word", *strata], observed=True, dropna=False).sentimentscore.agg(
+        sampled="size", mean="mean", std="std"
+    )
+    df.insert(0, "documents", sizes.reindex(df.index.droplevel("word")).to_numpy())
+    # The finite population correction makes the interval of a fully scored stratum zero wide
+    correction = np.sqrt(1 - df.sampled / df.documents)
+    half_width = z * df["std"] / np.sqrt(df.sampled) * correction
+    half_width[df.sampled == df.documents] = 0.0
+    df["mean_low"] = df["mean"] - half_width
+    df["mean_high"] = df["mean"] + half_width
+    for column in ["mean", "mean_low", "mean_high"]:
+        df[column.replace("mean", "total")] = df[column] * df.documents
+    return df.drop(columns="std")
+
+
+def sample_sentiment(
+    corpus: pd.DataFrame,
+    word: Union[str, List[str]],
+    strata: Union[str, List[str]] = "year",
+    target_width: float = 1.0,
+    confidence: float = 0.95,
+    fraction: float = 0.05,
+    min_documents: int = 10,
+    growth: float = 2.0,
+    seed: int = 1,
+    docid_column: str = "dhlabid",
+    **kwargs,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Estimate the sentiment score per document in each stratum of ``corpus`` from a sample.
+
+    Each stratum, e.g. each year, starts with a random ``fraction`` of its documents,
+    and at least ``min_documents``. The sample of a stratum grows ``growth`` times per round,
+    until the confidence interval of its mean score per document is at most ``target_width``
+    wide, or all its documents are scored. Sampled documents without hits have a score of 0.
+
+    :param strata: one or more corpus columns to sample by, e.g. ``["year", "city"]``
+    :param float target_width: max width of the confidence interval of the mean score, positive
+    :param float fraction: share of each stratum in the first round, in (0, 1]
+    :param float growth: how many times the sample grows per round, greater than 1
+    :param int seed: seed of the random order of the documents in each stratum
+    :param kwargs: other arguments of ``count_and_score_target_words``, e.g. ``workers``
+    :return: the estimates per word and stratum, see ``estimate_strata``,
+        and the result of ``count_and_score_target_words`` for the sampled documents,
+        with the number of documents sampled in each round in ``df.attrs["sample"]``
+    """
+    if not target_width > 0:
+        raise ValueError(f"target_width must be positive, got {target_width}")
+    if not 0 < fraction <= 1:
+        raise ValueError(f"fraction must be in (0, 1], got {fraction}")
+    if not min_documents >= 0:
+        raise ValueError(f"min_documents must not be negative, got {min_documents}")
+    if not growth > 1:
+        raise ValueError(f"growth must be greater than 1, got {growth}")
+    if is_corpus(corpus):
+        corpus = corpus.frame
+    strata = make_list(strata)
+    missing = [col for col in strata if col not in corpus.columns]
+    if missing:
+        raise ValueError(f"The corpus has no {', '.join(missing)} column to sample by")
+    kwargs["memo"] = kwargs.get("memo") or ScoreMemo()
+    workers = kwargs.get("workers", 1)
+
+    groups = corpus.groupby(strata, dropna=False)
+    sizes = groups.size()
+    stratum = groups.ngroup().to_numpy()
+    # The rank of each document in a random order within its stratum
+    shuffled = corpus.sample(frac=1, random_state=seed)
+    rank = shuffled.groupby(strata, dropna=False).cumcount().reindex(corpus.index).to_numpy()
+    target = np.minimum(np.maximum(np.ceil(fraction * sizes), min_documents), sizes).to_numpy()
+
+    scored = np.zeros(len(corpus), dtype=bool)
+    results, rounds = [], []
+    with collect_metrics() as metrics, ExitStack() as stack:
+        if kwargs.get("pool") is None and workers > 1:
+            lexicon = kwargs["lexicon"] = kwargs.get("lexicon") or load_lexicon()
+            kwargs["pool"] = stack.enter_context(scoring_pool(lexicon, workers))
+        while True:
+            new = ~scored & (rank < target[stratum])
+            scored |= new
+            rounds.append(int(new.sum()))
+            logging.info(f"Sampling round {len(rounds)}: scoring {rounds[-1]} more documents")
+            results.append(count_and_score_target_words(corpus[new], word, **kwargs))
+            df = concat_compact(results)
+
+            sample = corpus.loc[scored, [docid_column, *strata]]
+            values = (
+                pd.MultiIndex.from_product(
+                    [sample[docid_column], make_list(word)], names=[docid_column, "word"]
+                )
+                .to_frame(index=False)
+                .merge(sample, on=docid_column)
+            )
+            if df.empty:
+                # no hits in the sample so far
+                values["sentimentscore"] = 0
+            else:
+                scores = df.groupby([docid_column, "word"], observed=True).sentimentscore.sum()
+                values = values.merge(
+                    scores.reset_index(), on=[docid_column, "word"], how="left"
+                ).fillna({"sentimentscore": 0})
+            estimates = estimate_strata(values, sizes, strata, confidence)
+
+            too_wide = ~(estimates.mean_high - estimates.mean_low <= target_width)
+            widen = (
+                too_wide.groupby(level=strata, dropna=False).any().reindex(sizes.index).to_numpy()
+                & (target < sizes.to_numpy())
+            )
+            grown = np.where(widen, np.minimum(np.ceil(target * growth), sizes), target)
+            if not widen.any() or (grown == target).all():
+                break
+            target = grown
+
+    df.attrs["metrics"] = metrics.to_dict()
+    df.attrs["sample"] = {
+        "documents": len(corpus),
+        "sampled_documents": int(scored.sum()),
+        "rounds": rounds,
+        "target_width": target_width,
+        "target_reached": not bool(too_wide.any()),
+    }
+    return estimates, df
+
+
+# Aggregation cube
+CUBE_DIMENSIONS = ["word", "year", "month", "city", "title"]
+CUBE_MEASURES = ["documents", "count", "positive", "negative", "sentimentscore"]
+
+
+class SentimentCube:
+    """Sentiment scores summed up per word, year, month, city and title.
+
+    The cube is computed once from the row-level result, and is much smaller,
+    so any slice or drill-down is a quick ``query`` instead of a new groupby over the result.
+
+    :param frame: one row per combination of dimension values, with the summed measures,
+        see ``from_result``
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+
+    def __repr__(self):
+        return f"SentimentCube({len(self.frame)} cells, dimensions={self.dimensions})"
+
+    @property
+    def dimensions(self) -> List[str]:
+        return [col for col in CUBE_DIMENSIONS if col in self.frame.columns]
+
+    @classmethod
+    def from_result(cls, df: pd.DataFrame, docid_column: str = "dhlabid") -> "SentimentCube":
+        """Sum up the ``CUBE_MEASURES`` of a result from ``count_and_score_target_words``.
+
+        The result has one row per concordance, so ``documents`` and the keyword ``count``
+        are only taken from the first row of each document and word.
+        The month is taken from the ``timestamp``, and dimensions missing from the result are left out.
+        """
+        if "timestamp" in df.columns:
+            df = df.assign(month=pd.to_numeric(df.timestamp, errors="coerce") // 100 % 100)
+        first = ~df.duplicated([docid_column, "word"]).to_numpy()
+        df = df.assign(documents=first.astype(np.int64))
+        if "count" in df.columns:
+            df["count"] = np.where(first, df["count"].to_numpy(dtype=np.int64), 0)
+        columns = [col for col in CUBE_DIMENSIONS + CUBE_MEASURES if col in df.columns]
+        return cls._sum_cells(df[columns])
+
+    @classmethod
+    def concat(cls, cubes: List["SentimentCube"]) -> "SentimentCube":
+        """Combine the cubes of several batches of a result into one."""
+        return cls._sum_cells(concat_compact([cube.frame for cube in cubes]))
+
+    @classmethod
+    def _sum_cells(cls, df: pd.DataFrame) -> "SentimentCube":
+        # The sums are kept as int64, so sums of sums don't overflow
+        dimensions = [col for col in CUBE_DIMENSIONS if col in df.columns]
+        frame = (
+            df.groupby(dimensions, observed=True, dropna=False, sort=False)
+            .sum()
+            .astype(np.int64)
+            .reset_index()
+        )
+        return cls(frame.assign(**compact_frame(frame[dimensions], max_category_ratio=1.0)))
+
+    def values(self, dimension: str) -> list:
+        """The values of a ``dimension`` in the cube, sorted."""
+        return self.frame[dimension].dropna().sort_values().unique().tolist()
+
+    def query(self, by: Union[str, List[str]] = "year", **filters) -> pd.DataFrame:
+        """Sum up the measures by the dimensions ``by``, in the cells that match ``filters``.
+
+        :param by: one or more dimensions to group by, e.g. ``["year", "month"]``
+        :param filters: a value or a list of values for some dimensions, e.g. ``city=["Bergen", "Molde"]``
+        :return: a dataframe of the summed measures, indexed by the values of ``by``
+        """
+        frame = self.frame
+        if filters:
+            mask = np.ones(len(frame), dtype=bool)
+            for dimension, values in filters.items():
+                if not isinstance(values, (list, tuple, set)):
+                    values = [values]
+                mask &= frame[dimension].isin(values).to_numpy()
+            frame = frame[mask]
+        measures = [col for col in CUBE_MEASURES if col in frame.columns]
+        return frame.groupby(make_list(by), observed=True)[measures].sum()
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Store the cube in a Parquet file."""
+        path = Path(path)
+        self.frame.to_parquet(path, index=False)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "SentimentCube":
+        return cls(pd.read_parquet(path))
+
+
+# Background jobs
+class JobCancelled(Exception):
+    """Raised in the thread of an ``AnalysisJob`` when the job is cancelled."""
+
+
+def corpus_fingerprint(corpus: pd.DataFrame) -> str:
+    """Compute a sha256 checksum of the documents in ``corpus``, in order."""
+    if is_corpus(corpus):
+        corpus = corpus.frame
+    ids = corpus.dhlabid if "dhlabid" in corpus else corpus.urn
+    return hashlib.sha256("\n".join(ids.astype(str)).encode("utf-8")).hexdigest()
+
+
+class AnalysisJob:
+    """A sentiment analysis submitted to a ``JobQueue``.
+
+    The analysis runs in a worker thread of the queue.
+    Poll ``status`` and ``progress`` to follow it, and call ``result`` to get the dataframe.
+    When the job is done, ``cube`` holds the ``SentimentCube`` of the result.
+    """
+
+    def __init__(self, key: str, word: Union[str, List[str]], documents: int):
+        self.key = key
+        self.word = word
+        self.documents = documents
+        self.status = "queued"
+        self.progress = 0.0
+        self.subscribers = 1
+        self.future = None
+        self.cube = None
+        self._cancel = threading.Event()
+
+    def __repr__(self):
+        return f"AnalysisJob({self.key!r}, word={self.word!r}, status={self.status!r})"
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, done: int, total: int):
+        """Progress callback of the analysis, it stops the analysis if the job is cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.key)
+        self.progress = done / total if total else 1.0
+
+    def run(self, corpus: pd.DataFrame, kwargs: dict) -> pd.DataFrame:
+        self.status = "running"
+        try:
+            if self._cancel.is_set():
+                raise JobCancelled(self.key)
+            df = count_and_score_target_words(corpus, self.word, progress=self.report, **kwargs)
+            with stage("cube"):
+                self.cube = SentimentCube.from_result(df)
+        except JobCancelled:
+            self.status = "cancelled"
+            logging.info(f"Cancelled analysis job {self.key}")
+            raise
+        except Exception:
+            self.status = "failed"
+            logging.exception(f"Analysis job {self.key} failed")
+            raise
+        self.progress = 1.0
+        self.status = "done"
+        return df
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float = None) -> pd.DataFrame:
+        """Wait for the analysis and return its dataframe.
+
+        :raises JobCancelled: if the job was cancelled
+        """
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise JobCancelled(self.key) from None
+
+
+class JobQueue:
+    """Run sentiment analyses as jobs in a shared pool of worker threads.
+
+    A job is keyed by the corpus, the word, the lexicon and the options of the analysis.
+    Identical requests share one job while it is queued or running,
+    and the ``max_finished`` most recently finished jobs are kept as a cache of results.
+
+    :param int workers: number of analyses to run at the same time
+    :param int max_finished: number of finished jobs to keep
+    """
+
+    # Options that change how a job runs, but not its result
+    runtime_options = ("memo", "pool", "progress", "checkpoint_dir")
+
+    def __init__(self, workers: int = 2, max_finished: int = 32):
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sentiment-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def job_key(cls, corpus: pd.DataFrame, word: Union[str, List[str]], **kwargs) -> str:
+        """Hash the corpus, the word, the lexicon version and the options that change the result.
+
+        :raises TypeError: if an option other than the ``runtime_options`` is not JSON serializable
+        """
+        lexicon = kwargs.pop("lexicon", None) or load_lexicon()
+        options = {key: value for key, value in kwargs.items() if key not in cls.runtime_options}
+        try:
+            payload = json.dumps(
+                {
+                    "corpus": corpus_fingerprint(corpus),
+                    "word": make_list(word),
+                    "lexicon": lexicon.version,
+                    **options,
+                },
+                sort_keys=True,
+            )
+        except TypeError as e:
+            raise TypeError(f"The options of an analysis job must be JSON serializable: {e}") from None
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def submit(self, corpus: pd.DataFrame, word: Union[str, List[str]], **kwargs) -> AnalysisJob:
+        """Start an analysis of ``word`` in ``corpus``, or join an identical one.
+
+        :param kwargs: other arguments to ``count_and_score_target_words``
+        :return: a new job, a job that is already queued or running,
+            or a finished job with the result.
+        """
+        key = self.job_key(corpus, word, **kwargs)
+        with self._lock:
+            job = self._jobs.get(key)
+            reusable = job is not None and job.status != "failed" and not job.cancel_requested
+            if reusable:
+                if not job.done():
+                    job.subscribers += 1
+                self._jobs.move_to_end(key)
+                return job
+            job = AnalysisJob(key, word, len(corpus))
+            job.future = self._pool.submit(job.run, corpus, kwargs)
+            self._jobs[key] = job
+            self._evict()
+        logging.info(f"Submitted analysis job {key} for {word!r} in {len(corpus)} documents")
+        return job
+
+    def cancel(self, job: AnalysisJob):
+        """Withdraw one request for ``job``, and cancel it when no one else waits for it.
+
+        A running job stops after the current batch.
+        """
+        with self._lock:
+            job.subscribers -= 1
+            if job.subscribers > 0 or job.done():
+                return
+            job._cancel.set()
+            if job.future.cancel():
+                job.status = "cancelled"
+
+    def jobs(self) -> List[AnalysisJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _evict(self):
+        finished = [key for key, job in self._jobs.items() if job.done()]
+        for key in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[key]
+
+    def shutdown(self, wait: bool = True):
+        for job in self.jobs():
+            job._cancel.set()
+            job.future.cancel()
+        self._pool.shutdown(wait=wait)
+
+
+# Export
+class ResultWriter:
+    """Write result frames to a file one batch at a time, without holding all results in memory.
+
+    The format is chosen from the file suffix: ``.csv``, ``.csv.gz``, ``.parquet`` or ``.xlsx``,
+    or given as ``file_format`` when writing to a binary buffer, see ``export_bytes``.
+    All batches must have the same columns, like the ones from ``iter_sentiment_batches``.
+    Excel files are written in openpyxl's write-only mode,
+    and rows beyond the row limit of a sheet continue on a new sheet.
+    A file on disk is written next to ``path`` and moved there when it is closed,
+    and removed instead if the ``with`` block raises, so a failed run leaves no file behind.
+
+    :param columns: the columns of the file if no batch is written,
+        so a run without results still writes a file with a header, see ``result_columns``
+    """
+
+    formats = (".csv", ".csv.gz", ".parquet", ".xlsx")
+    excel_max_rows = 1_048_576
+
+    def __init__(self, path, file_format: str = None, columns: List[str] = None):
+        self.path = None if hasattr(path, "write") else Path(path)
+        self.target = path if self.path is None else self.path.with_name(f"{self.path.name}.tmp")
+        name = file_format or getattr(self.path, "name", "")
+        self.format = next((f for f in self.formats if name.endswith(f)), None)
+        if self.format is None:
+            raise ValueError(f"Unsupported output file {path}, use one of {self.formats}")
+        self.columns = columns
+        self.rows = 0
+        self._file = None
+        self._write_header = True
+        self._parquet = None
+        self._workbook = None
+        self._sheet = None
+        self._sheet_rows = 0
+
+    def write(self, df: pd.DataFrame):
+        """Append the rows of ``df`` to the file."""
+        if self.format == ".parquet":
+            self._write_parquet(df)
+        elif self.format == ".xlsx":
+            self._write_excel(df)
+        else:
+            if self._file is None:
+                self._file = self._open_text()
+            df.to_csv(self._file, header=self._write_header, index=False)
+            self._write_header = False
+        self.rows += len(df)
+
+    def _open_text(self):
+        if isinstance(self.target, Path):
+            opener = gzip.open if self.format == ".csv.gz" else open
+            return opener(self.target, "wt", encoding="utf-8", newline="")
+        buffer = self.target
+        if self.format == ".csv.gz":
+            buffer = gzip.GzipFile(fileobj=buffer, mode="wb")
+        return TextIOWrapper(buffer, encoding="utf-8", newline="")
+
+    def _write_parquet(self, df: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # batches from compact_frame can have different categories and integer widths
+        df = df.astype(
+            {
+                col: "int64" if pd.api.types.is_integer_dtype(dtype) else "string"
+                for col, dtype in df.dtypes.items()
+                if dtype == object
+                or isinstance(dtype, pd.CategoricalDtype)
+                or pd.api.types.is_integer_dtype(dtype)
+            }
+        )
+        schema = self._parquet.schema if self._parquet is not None else None
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.target, table.schema)
+        self._parquet.write_table(table)
+
+    def _write_excel(self, df: pd.DataFrame):
+        from openpyxl import Workbook
+
+        if self._workbook is None:
+            self._workbook = Workbook(write_only=True)
+        values = df.astype(object).where(df.notna(), None)
+        for row in itertools.chain([None], values.itertuples(index=False, name=None)):
+            if self._sheet is None or self._sheet_rows == self.excel_max_rows:
+                sheet_name = f"Sheet{len(self._workbook.worksheets) + 1}"
+                self._sheet = self._workbook.create_sheet(sheet_name)
+                self._sheet.append([str(col) for col in df.columns])
+                self._sheet_rows = 1
+            if row is not None:
+                self._sheet.append(row)
+                self._sheet_rows += 1
+
+    def close(self):
+        """Finish the file, and move it to ``path`` if it is written to disk."""
+        if self._file is None and self._parquet is None and self._workbook is None:
+            self.write(pd.DataFrame(columns=self.columns or []))
+        if self._workbook is not None:
+            self._workbook.save(self.target)
+        self._close_files()
+        if self.path is not None:
+            os.replace(self.target, self.path)
+
+    def discard(self):
+        """Close the file without keeping it, e.g. when a run fails before all batches are written."""
+        self._close_files()
+        if self.path is not None:
+            self.target.unlink(missing_ok=True)
+
+    def _close_files(self):
+        self._workbook = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._file is not None:
+            if isinstance(self._file, TextIOWrapper):
+                # leave the caller's buffer open
+                self._file.flush()
+                inner = self._file.detach()
+                if isinstance(inner, gzip.GzipFile):
+                    inner.close()
+            else:
+                self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def export_bytes(df: pd.DataFrame, file_format: str = ".xlsx", chunksize: int = 50_000) -> bytes:
+    """Export ``df`` to the contents of a file in memory, written ``chunksize`` rows at a time.
+
+    :param str file_format: one of ``ResultWriter.formats``
+    """
+    buffer = BytesIO()
+    with ResultWriter(buffer, file_format) as writer:
+        for i in range(0, max(len(df), 1), chunksize):
+            writer.write(df.iloc[i : i + chunksize])
+    return buffer.getvalue()
+
+
+# Startup
+def warm_up(lexicon: str = "norsentlex") -> dict:
+    """Do the slow first steps of an analysis ahead of time, e.g. before an app replica takes requests.
+
+    Imports dhlab and its tokenizer, loads the lexicon and its matcher,
+    and opens the response cache. Nothing is fetched from the API,
+    except NorSentLex if it is not compiled yet.
+
+    :param str lexicon: name of the compiled lexicon to load, see ``load_lexicon``
+    :return: the seconds spent on each step
+    """
+    steps = {
+        "dhlab": import_dhlab,
+        "tokenizer": import_tokenizer,
+        "lexicon": lambda: load_lexicon(lexicon).matcher.count("<b>oppvarming</b>"),
+        "response_cache": get_response_cache,
+    }
+    seconds = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        step()
+        seconds[name] = time.perf_counter() - start
+    logging.info(f"Warmed up in {sum(seconds.values()):.2f}s: {seconds}")
+    return seconds
+
+
+# Command line interface
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m sentiment",
+        description="Compute the sentiment of keywords in a corpus, and stream the results to a file.",
+    )
+    parser.add_argument("words", nargs="*", help="one or more keywords to analyse")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="output file ending with .csv, .csv.gz, .parquet or .xlsx",
+    )
+    parser.add_argument(
+        "--warm-up",
+        action="store_true",
+        help="only load the lexicon and the slow imports, e.g. when building a container image",
+    )
+    corpus = parser.add_argument_group(
+        "corpus", "read the corpus from a file, or build it from metadata filters"
+    )
+    corpus.add_argument("--corpus", help="corpus definition in a .csv or .xlsx file")
+    corpus.add_argument("--doctype", default="digavis")
+    corpus.add_argument("--city")
+    corpus.add_argument("--title")
+    corpus.add_argument("--author")
+    corpus.add_argument("--from-year", type=int)
+    corpus.add_argument("--to-year", type=int)
+    corpus.add_argument("--limit", type=int, default=1000, help="max number of documents")
+    run = parser.add_argument_group("analysis")
+    run.add_argument("--lexicon", default="norsentlex", help="name of a compiled lexicon")
+    run.add_argument("--window", type=int, default=200, help="concordance window size")
+    run.add_argument(
+        "--score-memo",
+        metavar="PATH",
+        help="SQLite file to keep concordance scores in across runs, see ScoreMemo",
+    )
+    run.add_argument(
+        "--windows",
+        type=int,
+        nargs="+",
+        help="smaller window sizes to score as well, cut from the fetched concordances",
+    )
+    run.add_argument("--batch-size", type=int, default=1000, help="documents per batch")
+    run.add_argument("--workers", type=int, default=1, help="scoring processes")
+    run.add_argument("--chunksize", type=int, default=2000, help="snippets per scoring task")
+    run.add_argument("--checkpoint-dir", help="checkpoint batches here, and resume earlier runs")
+    run.add_argument("--no-cache", action="store_true", help="bypass cached API responses")
+    run.add_argument("--metrics", help="write Prometheus counters for each stage to this file")
+    run.add_argument(
+        "--cube",
+        metavar="PATH",
+        help="also write the scores summed per word, year, month, city and title to this Parquet file",
+    )
+    run.add_argument("-v", "--verbose", action="store_true", help="log progress per batch")
+    args = parser.parse_args(argv)
+    if not args.warm_up and not (args.words and args.output):
+        parser.error("the following arguments are required: words, -o/--output")
+    if any(size > args.window for size in args.windows or []):
+        parser.error(f"--windows can not be larger than --window {args.window}")
+    return args
+
+
+def load_cli_corpus(args: argparse.Namespace) -> pd.DataFrame:
+    """Load the corpus from ``args.corpus``, or build it from the metadata filters."""
+    if args.corpus:
+        # Read with pandas like load_corpus_from_file, without importing dhlab
+        if args.corpus.endswith(".xlsx"):
+            return pd.read_excel(args.corpus)
+        return pd.read_csv(args.corpus)
+    return load_corpus(
+        use_cache=not args.no_cache,
+        doctype=args.doctype,
+        fulltext=" OR ".join(args.words),
+        freetext=f"city: {args.city}" if args.city else None,
+        title=args.title,
+        author=args.author,
+        from_year=args.from_year,
+        to_year=args.to_year,
+        limit=args.limit,
+    )
+
+
+def main(argv: List[str] = None) -> int:
+    """Run a sentiment analysis from the command line, and return the exit code."""
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    if args.warm_up:
+        try:
+            seconds = warm_up(args.lexicon)
+        except Exception as e:
+            print(f"Warm-up failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Warmed up in {sum(seconds.values()):.2f}s")
+        print(pd.Series(seconds, name="seconds").round(3).to_string())
+        return 0
+
+    start = time.perf_counter()
+    documents = set()
+    cubes = []
+    try:
+        with collect_metrics() as metrics, ResultWriter(args.output) as writer:
+            corpus = load_cli_corpus(args)
+            if corpus.empty:
+                raise ValueError("The corpus has no documents")
+            writer.columns = result_columns(corpus.columns, args.windows)
+            options = dict(
+                batch_size=args.batch_size,
+                lexicon=load_lexicon(args.lexicon),
+                workers=args.workers,
+                chunksize=args.chunksize,
+                window=args.window,
+                windows=args.windows,
+                use_cache=not args.no_cache,
+                memo=ScoreMemo(path=args.score_memo),
+            )
+            batches = (
+                iter_checkpointed_batches(corpus, args.words, args.checkpoint_dir, **options)
+                if args.checkpoint_dir
+                else iter_sentiment_batches(corpus, args.words, **options)
+            )
+            for df in batches:
+                writer.write(df)
+                documents.update(df.dhlabid)
+                if args.cube:
+                    cubes.append(SentimentCube.from_result(df))
+                logging.info(f"Wrote {writer.rows} rows to {args.output}")
+            if args.cube:
+                if not cubes:
+                    cubes.append(SentimentCube.from_result(pd.DataFrame(columns=writer.columns)))
+                SentimentCube.concat(cubes).save(args.cube)
+    except Exception as e:
+        if args.verbose:
+            logging.exception(e)
+        print(f"Sentiment analysis failed: {e}", file=sys.stderr)
+        return 1
+
+    if args.metrics:
+        metrics.write_prometheus(args.metrics)
+    seconds = time.perf_counter() - start
+    duplicates = options["memo"].stats()["duplicate_rate"]
+    print(
+        f"Wrote {writer.rows} rows for {len(args.words)} keyword(s) "
+        f"in {len(documents)} of {len(corpus)} documents to {args.output} in {seconds:.1f}s, "
+        f"{duplicates:.0%} of the concordances were duplicates"
+    )
+    print(metrics.to_frame().round(3).to_string())
+    return 0
+
+
 # DUMPING GROUND
 
 # Unnecessary function
@@ -281,7 +3092,7 @@ def unpivot(frame):
 
 
 # Unnecessary function
-def count_terms(corpus: dh.Corpus, search_terms: str):
+def count_terms(corpus: "dh.Corpus", search_terms: str):
     """wrapper to undo the pivot in the get_document_frequencies function."""
     words = make_list(search_terms)
     count_matrix = corpus.count(words).frame
@@ -301,26 +3112,14 @@ def timestamp_generator(from_year: int, to_year: int) -> Generator:
         yield date
 
 
-def get_context_bow(urn, word):
+def get_context_bow(urn, word, exact: bool = False):
+    """Sum up the token counts of the paragraphs in the document ``urn`` where ``word`` occurs.
 
-    freq_col = "counts"
-    token_col = "token"
-    par_idx_col = "paragraph"
+    :param bool exact: if True, only match the token ``word``,
+        otherwise also tokens that start with it, e.g. "barnevernet" for "barnevern"
+    """
+    return ParagraphCounts.fetch([urn]).context(word if exact else f"{word.rstrip('*')}*")
 
-    # Get a dataframe with all paragraphs in a URN and their word counts
-    chunks = get_chunks_para(urn)
-    total = [
-        {par_idx_col: i, token_col: token, freq_col: count}
-        for i, para in enumerate(chunks)
-        for token, count in para.items()
-    ]
-    df = pd.DataFrame(total)
-
-    # Filter dataframe on the paragraphs that contain the search word
-    df["lowercase"] = df[token_col].str.lower()
-    matching_paragraphs = df[par_idx_col][df["lowercase"].str.match(word)]
-    cdf = df[df.paragraph.isin(matching_paragraphs)]
-    context = cdf[freq_col]
-    context.index = cdf[token_col]
-    context = group_index_terms(context)
-    return context
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,13 @@
 import datetime
-from io import BytesIO
+import os
+import threading
+import time
 
 import pandas as pd
 import streamlit as st
-import dhlab as dh
 
-from sentiment import compute_sentiment_analysis
+import sentiment
+from sentiment import JobCancelled, JobQueue, collect_metrics, export_bytes, load_corpus
 
 ## CONSTANTS ##
 max_size_corpus = 20000
@@ -98,18 +100,28 @@ def define_params():
 
 @st.cache_data(persist=True, show_spinner=False)
 def load_data(**params):
-    """Instantiate a Corpus object."""
-    df = dh.Corpus(
-        doctype=v(params.get("doctype")),
-        author=v(params.get("author")),
-        fulltext=v(params.get("word")),
-        freetext=v(params.get("freetext")),
-        from_year=params.get("from_year", default_start_date),
-        to_year=params.get("to_year", year),
-        title=v(params.get("title")),
-        limit=params.get("limit", default_size),
-    ).frame
-    return df
+    """Instantiate a Corpus object, and return it with the time spent loading it.
+
+    The metrics are cached with the corpus, so they belong to it also when the cache is hit.
+    """
+    with collect_metrics() as metrics:
+        df = load_corpus(
+            doctype=v(params.get("doctype")),
+            author=v(params.get("author")),
+            fulltext=v(params.get("word")),
+            freetext=v(params.get("freetext")),
+            from_year=params.get("from_year", default_start_date),
+            to_year=params.get("to_year", year),
+            title=v(params.get("title")),
+            limit=params.get("limit", default_size),
+        )
+    return df, metrics.to_frame()
+
+
+def set_corpus(corpus, metrics=None):
+    """Use ``corpus`` in the session, with the metrics of loading it, or none for an uploaded corpus."""
+    st.session_state.corpus = corpus
+    st.session_state.corpus_metrics = metrics
 
 
 def corpus_selection():
@@ -126,9 +138,9 @@ def corpus_selection():
 
         if metadata_submitted:
             with st.spinner('Laster inn korpus...'):
-                corpus = load_data(**params)
+                corpus, metrics = load_data(**params)
             st.write(f"Korpus lastet inn med {len(corpus)} dokumenter.")
-            st.session_state.corpus = corpus
+            set_corpus(corpus, metrics)
 
     with upload_tab:
         loaded_corpus = st.file_uploader(
@@ -139,40 +151,168 @@ def corpus_selection():
             )
         if st.session_state.file_uploader is not None:
             try:
-                st.session_state.corpus = pd.read_excel(loaded_corpus)
+                set_corpus(pd.read_excel(loaded_corpus))
             except:
                 st.error("Opplasting feilet. Prøv igjen med en .xlsx-fil.")
 
 
-@st.cache_data
-def to_excel(df):
-    """Make an excel object out of a dataframe as an IO-object"""
-    output = BytesIO()
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": ".xlsx",
+    "Parquet (.parquet)": ".parquet",
+    "CSV, gzip-komprimert (.csv.gz)": ".csv.gz",
+}
+
 
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Sheet1', index=False)
+@st.cache_data(max_entries=8, show_spinner=False)
+def export_result(job_key, file_format, _result):
+    """Export the result of an analysis job to the bytes of a file, cached per job and format."""
+    return export_bytes(_result, file_format)
 
-    processed_data = output.getvalue()
-    return processed_data
+
+def download_result(job, result):
+    """Let the user choose a file format, and make the file only when it is asked for."""
+    slot1, slot2 = st.columns([2, 3])
+    with slot1:
+        label = st.selectbox(
+            "Filformat",
+            list(EXPORT_FORMATS),
+            help="Parquet og komprimert CSV lages raskere enn Excel for store resultater.",
+        )
+        file_format = EXPORT_FORMATS[label]
+    with slot2:
+        filnavn = st.text_input("Filnavn for nedlasting", f"sentimentscore_{today}")
+    if not filnavn.endswith(file_format):
+        filnavn += file_format
+
+    if st.button("Lag fil for nedlasting"):
+        st.session_state.export = (job.key, file_format)
+    if st.session_state.get("export") == (job.key, file_format):
+        with st.spinner("Lager fil..."):
+            data = export_result(job.key, file_format, result)
+        st.download_button(
+            f"Last ned {filnavn}",
+            data,
+            filnavn,
+            help = "Excel-filer åpnes i Excel eller tilsvarende regnearkprogram.",
+        )
+
+
+def show_metrics(result):
+    """Show the time spent in each stage of the analysis."""
+    metrics = pd.DataFrame.from_dict(result.attrs.get("metrics", {}), orient="index")
+    if st.session_state.get("corpus_metrics") is not None:
+        metrics = pd.concat([st.session_state.corpus_metrics, metrics])
+    plan = result.attrs.get("plan")
+    if plan:
+        st.caption(
+            f"{plan['documents_with_hits']} av {plan['documents']} dokumenter inneholder nøkkelordet, "
+            f"{plan['fetched_concordances']} konkordanser hentet i {plan['batches']} forespørsler."
+        )
+        if plan["truncated_batches"]:
+            st.warning(
+                f"{plan['truncated_batches']} av forespørslene har dokumenter med flere konkordanser "
+                "enn grensen, så noen konkordanser kan mangle i resultatet."
+            )
+    with st.expander("Tidsbruk per steg"):
+        st.dataframe(
+            metrics.rename(
+                columns={
+                    "calls": "kall",
+                    "seconds": "sekunder",
+                    "rows": "rader",
+                    "bytes": "bytes hentet",
+                    "memory_mb": "minneøkning (MB)",
+                }
+            )
+        )
 
 
-def create_plot(result):
-    """Plot the result scores."""
-    r = result[["year","positive", "negative", "sentimentscore"]]
-    rgroup = r.groupby("year")[["sentimentscore", "positive", "negative"]].sum()
+FACETS = {
+    "År": ["year"],
+    "Måned": ["year", "month"],
+    "Sted": ["city"],
+    "Avis": ["title"],
+}
+
+
+def select_facets(cube):
+    """Let the user choose how to group the scores, and which places and titles to include."""
+    slot1, slot2, slot3 = st.columns([1, 2, 2])
+    with slot1:
+        by = FACETS[st.selectbox("Vis etter", list(FACETS))]
+    filters = {}
+    for slot, dimension, label in ((slot2, "city", "Sted"), (slot3, "title", "Avis")):
+        if dimension in cube.dimensions:
+            with slot:
+                values = st.multiselect(label, cube.values(dimension), help="Ingen valgt gir alle.")
+            if values:
+                filters[dimension] = values
+    return [dimension for dimension in by if dimension in cube.dimensions], filters
+
+
+def create_plot(cube, by=("year",), **filters):
+    """Plot the result scores summed up by the dimensions ``by`` of the cube, or None if no scores match."""
+    rgroup = cube.query(list(by), **filters)[["sentimentscore", "positive", "negative"]]
+    if rgroup.empty:
+        return None
     return rgroup.plot().figure
 
-@st.cache_data
-def sentiment_analysis(word):
-    """Compute the sentiment analysis score."""
+@st.cache_resource
+def warm_up():
+    """Warm up the analysis in a background thread, once per server process.
+
+    Set ``SENTIMENT_WARM_UP=1`` to do it when the first session starts,
+    so the page is shown right away and later analyses don't wait for the slow imports.
+    Streamlit passes its health check before any session, so the first session may still
+    wait for the warm-up if it starts an analysis right away.
+    """
+    thread = threading.Thread(target=sentiment.warm_up, name="sentiment-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def job_queue():
+    """The queue of analysis jobs, shared by all sessions of the app."""
+    return JobQueue(workers=2)
+
+
+def submit_analysis(word):
+    """Start the sentiment analysis of ``word`` in the loaded corpus as a background job."""
     if ("corpus" not in st.session_state):
-        st.session_state.corpus = load_data(word=word, limit=50)
+        set_corpus(*load_data(word=word, limit=50))
+    previous = st.session_state.get("job")
+    if previous is not None and not previous.done():
+        job_queue().cancel(previous)
+    st.session_state.job = job_queue().submit(st.session_state.corpus, word)
+
+
+def sentiment_analysis(job):
+    """Follow the analysis job until it is done, and show the result scores."""
+    if not job.done():
+        if st.button("Avbryt analysen"):
+            job_queue().cancel(job)
+        progress_bar = st.progress(0.0)
+        while not job.done():
+            progress_bar.progress(
+                job.progress,
+                text=f"Analyserer «{job.word}» i {job.documents} dokumenter ({job.progress:.0%})",
+            )
+            time.sleep(0.5)
+        progress_bar.empty()
     try:
-        result = compute_sentiment_analysis(st.session_state.corpus, word)
-        figure = create_plot(result)
-        st.pyplot(figure)
-        st.session_state.result = True
+        result = job.result()
+        by, filters = select_facets(job.cube)
+        figure = create_plot(job.cube, by, **filters) if by else None
+        if figure is not None:
+            st.pyplot(figure)
+        elif by:
+            st.info("Ingen treff for dette utvalget.")
+        show_metrics(result)
         return result
+    except JobCancelled:
+        st.info("Analysen ble avbrutt.")
+        del st.session_state.job
     except Exception as error:
         st.write("Last inn et korpus og prøv igjen.")
         st.error(error)
@@ -187,14 +327,15 @@ if __name__ == "__main__":
         initial_sidebar_state="auto"
     )
 
+    if os.environ.get("SENTIMENT_WARM_UP") == "1":
+        warm_up()
+
     header()
     st.write("Flere apper fra [DH-laben](https://www.nb.no/dh-lab) finner du [her](https://www.nb.no/dh-lab/apper/).")
 
     st.subheader("Tekstutvalg")
     corpus_selection()
 
-    st.session_state.result = False
-
     st.header("Analyser sentiment")
     with st.form(key='input_word'):
         word = st.text_input(
@@ -209,17 +350,12 @@ if __name__ == "__main__":
         )
         sentiment_button = st.form_submit_button(label = "Kjør!")
     if sentiment_button:
-        result = sentiment_analysis(word)
+        submit_analysis(word)
 
-    if "result" in st.session_state:
-        st.write("---")
-        filnavn = st.text_input("Filnavn for nedlasting", f"sentimentscore_{today}.xlsx")
-
-        if st.download_button(
-            'Last ned data i excelformat',
-            to_excel(result),
-            filnavn,
-            help = "Åpnes i Excel eller tilsvarende regnearkprogram."
-        ):
-            pass
+    result = None
+    if "job" in st.session_state:
+        result = sentiment_analysis(st.session_state.job)
 
+    if result is not None:
+        st.write("---")
+        download_result(st.session_state.job, result)
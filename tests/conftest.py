@@ -0,0 +1,22 @@
+import pytest
+
+import sentiment
+from tests.helpers import StubClient, frozen_lexicon
+
+
+@pytest.fixture
+def lexicon():
+    return frozen_lexicon()
+
+
+@pytest.fixture
+def stub_client(request):
+    """Answer the API requests of the pipeline offline, and restore the client afterwards.
+
+    Parametrize it indirectly with a ``StubClient`` subclass to answer some requests differently.
+    """
+    previous = sentiment._client
+    client = getattr(request, "param", StubClient)()
+    sentiment.set_client(client)
+    yield client
+    sentiment.set_client(previous)
@@ -0,0 +1,125 @@
+"""Synthetic concordances, a frozen lexicon and a stub API client for offline tests and benchmarks."""
+import random
+
+from sentiment import Lexicon
+
+POSITIVE = [
+    "god", "glad", "fin", "flott", "trygg", "vakker", "populær", "fornøyd",
+    "heldig", "spennende", "morsom", "sterk", "vellykket", "hyggelig",
+]
+NEGATIVE = [
+    "dårlig", "trist", "vond", "farlig", "redd", "sint", "svak", "syk",
+    "vanskelig", "kritisk", "alvorlig", "ulykke", "skuffet", "problem",
+]
+NEUTRAL = [
+    "og", "i", "det", "som", "på", "er", "en", "til", "av", "for", "med",
+    "har", "ikke", "den", "de", "om", "et", "var", "fra", "kommunen",
+    "skolen", "byen", "året", "barna", "foreldrene", "dag", "sier", "mener",
+    "Oslo", "Bergen", "Stortinget", "kr", "prosent", ",", ".", "...", "«", "»",
+]
+
+
+def frozen_lexicon() -> Lexicon:
+    """A small, fixed lexicon, so tests and benchmarks never need network access."""
+    return Lexicon(
+        name="benchmark", positive=frozenset(POSITIVE), negative=frozenset(NEGATIVE)
+    )
+
+
+def make_snippet(rng: random.Random, word: str = "iskrem", length: int = 35) -> str:
+    """Make a concordance snippet with ``word`` in bold, surrounded by random words."""
+    vocabulary = NEUTRAL * 4 + POSITIVE + NEGATIVE
+    left = rng.choices(vocabulary, k=length // 2)
+    right = rng.choices(vocabulary, k=length - length // 2)
+    words = [w.capitalize() if rng.random() < 0.05 else w for w in left + right]
+    return " ".join(words[: len(left)] + [f"<b>{word}</b>"] + words[len(left) :])
+
+
+def make_snippets(n: int, seed: int = 1, word: str = "iskrem") -> list:
+    """Make ``n`` reproducible concordance snippets."""
+    rng = random.Random(seed)
+    return [make_snippet(rng, word) for _ in range(n)]
+
+
+def make_corpus(n_docs: int, seed: int = 1):
+    """Make a newspaper corpus dataframe with ``n_docs`` documents."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    return pd.DataFrame(
+        {
+            "dhlabid": [1_000_000 + i for i in range(n_docs)],
+            "urn": [f"URN:NBN:no-nb_digavis_synthetic_{i}" for i in range(n_docs)],
+            "title": [rng.choice(["aftenposten", "bergenstidende", "adressa"]) for _ in range(n_docs)],
+            "city": [rng.choice(["Oslo", "Bergen", "Trondheim"]) for _ in range(n_docs)],
+            "timestamp": [rng.randint(2000, 2022) * 10000 + 101 for _ in range(n_docs)],
+            "doctype": "digavis",
+        }
+    ).assign(year=lambda df: df.timestamp // 10000)
+
+
+def make_collocation(n_terms: int, seed: int = 1):
+    """Make collocation counts with ``n_terms`` index terms, like ``dh.Corpus.coll``."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    vocabulary = NEUTRAL + POSITIVE + NEGATIVE
+    terms = [
+        rng.choice(vocabulary) + ("" if i < len(vocabulary) else str(i)) for i in range(n_terms)
+    ]
+    terms = [t.capitalize() if rng.random() < 0.1 else t for t in terms]
+    return pd.Series([rng.randint(1, 100) for _ in terms], index=terms, name="counts")
+
+
+class StubClient:
+    """Answers ``/build_corpus``, ``/conc``, ``/frequencies`` and ``/chunks_para`` requests offline.
+
+    ``/build_corpus`` answers with the first ``limit`` documents of ``make_corpus``.
+
+    Each document gets 1 to ``max_concordances`` reproducible snippets.
+    """
+
+    def __init__(self, max_concordances: int = 6, seed: int = 1):
+        self.max_concordances = max_concordances
+        self.seed = seed
+
+    def _doc(self, urn: str):
+        i = int(urn.rsplit("_", 1)[1])
+        rng = random.Random(self.seed * 1_000_003 + i)
+        return 1_000_000 + i, rng, rng.randint(1, self.max_concordances)
+
+    def post(self, endpoint: str, json: dict = None, use_cache: bool = True):
+        if endpoint == "build_corpus":
+            return make_corpus(json["limit"]).to_dict(orient="list")
+        if endpoint == "conc":
+            rows = []
+            for urn in json["urns"]:
+                docid, rng, n = self._doc(urn)
+                rows += [
+                    {"docid": docid, "urn": urn, "conc": make_snippet(rng, json["query"])}
+                    for _ in range(n)
+                ]
+            return rows[: json["limit"]]
+        if endpoint == "frequencies":
+            return [
+                [docid, word, 2 * n, 1000]
+                for word in json["words"]
+                for docid, _, n in map(self._doc, json["urns"])
+            ]
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    def get(self, endpoint: str, params: dict = None, use_cache: bool = True):
+        if endpoint == "chunks_para":
+            _, rng, n = self._doc(params["urn"])
+            paragraphs = []
+            for _ in range(3 * n):
+                bag = {}
+                for token in make_snippet(rng, "iskrem" if rng.random() < 0.3 else "is").split():
+                    token = token.replace("<b>", "").replace("</b>", "")
+                    bag[token] = bag.get(token, 0) + 1
+                paragraphs.append(bag)
+            return paragraphs
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    def throttle(self):
+        pass
@@ -0,0 +1,25 @@
+"""Snippets and a lexicon where the tokenizer splits or joins terms in special ways."""
+import sentiment
+from tests.helpers import NEGATIVE, POSITIVE
+
+SNIPPETS = [
+    "",
+    "...",
+    "Det var <b>iskrem</b> og glede, men også sorg ...",
+    "GLEDE! Glede? glede. Sorg-glede og glede/sorg",
+    "Han kom kl. 12.30 med dr. Hansen, bl.a. for å spise iskrem m.m.",
+    "§ 12 annet ledd, jf. kap. 3 og s. 45-47 ... vakker, vakker",
+    "Ca. 1.200 kr. ble brukt på 3,5 kg iskrem i år 1952.",
+    "O. J. Olsen og P. A. Munch skrev om fred og krig.",
+    "«Fryktelig», sa hun; «forferdelig!» (trist) [glad]",
+    "e-post: ola@nb.no — https://www.nb.no/items/URN:NBN:no-nb_digavis",
+    "<b>Iskrem</b><b>iskrem</b> iskrem... glad...trist",
+    "1) glad 2) trist 3) nr. 4 osv.",
+]
+
+# Terms that the tokenizer splits or joins in special ways, and an ellipsis that is never counted
+LEXICON = sentiment.Lexicon(
+    name="check",
+    positive=frozenset(POSITIVE + ["glede", "fred", "iskrem", "kl.", "12.30", "bl.a.", "1.200"]),
+    negative=frozenset(NEGATIVE + ["sorg", "krig", "fryktelig", "forferdelig", "nr.", "s.", "..."]),
+)
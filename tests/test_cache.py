@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import sentiment
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sentiment.time, "time", clock)
+    return clock
+
+
+def test_hits_and_misses(tmp_path):
+    cache = sentiment.ResponseCache(tmp_path / "cache.sqlite")
+    assert cache.get("a") is None
+    cache.set("a", {"rows": [1, 2]})
+    assert cache.get("a") == {"rows": [1, 2]}
+    assert cache.get("a") == {"rows": [1, 2]}
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["bytes"] > 0
+    # the entries outlive the process, the counters don't
+    reopened = sentiment.ResponseCache(tmp_path / "cache.sqlite")
+    assert reopened.get("a") == {"rows": [1, 2]}
+    assert (reopened.hits, reopened.misses) == (1, 0)
+
+
+def test_expired_entries_are_ignored_and_removed(tmp_path, clock):
+    cache = sentiment.ResponseCache(tmp_path / "cache.sqlite", ttl=60)
+    cache.set("old", "value")
+    clock.now += 30
+    cache.set("new", "value")
+    assert cache.get("old") == "value"
+
+    clock.now += 31
+    assert cache.get("old") is None
+    assert cache.get("new") == "value"
+    cache.set("newer", "value")
+    assert cache.stats()["entries"] == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    value = bytes(range(256)) * 4  # does not compress
+    cache = sentiment.ResponseCache(tmp_path / "cache.sqlite")
+    cache.set("probe", value)
+    size = cache.stats()["bytes"]
+    cache.clear()
+    cache.max_bytes = 3 * size
+
+    for key in ["a", "b", "c"]:
+        clock.now += 1
+        cache.set(key, value)
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("d", value)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in ["a", "c", "d"]] == [True, True, True]
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_use_cache_false_bypasses_and_replaces_the_entry(tmp_path):
+    cache = sentiment.ResponseCache(tmp_path / "cache.sqlite")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_set({"query": "iskrem"}, compute) == 1
+    assert cache.get_or_set({"query": "iskrem"}, compute) == 1
+    assert cache.get_or_set({"query": "iskrem"}, compute, use_cache=False) == 2
+    assert cache.get_or_set({"query": "iskrem"}, compute) == 2
+    assert cache.get_or_set({"query": "skole"}, compute) == 3
+    assert len(calls) == 3
+
+
+def test_keys_do_not_depend_on_the_order_of_the_parameters():
+    make_key = sentiment.ResponseCache.make_key
+    assert make_key({"a": 1, "b": [1, 2]}) == make_key({"b": [1, 2], "a": 1})
+    assert make_key({"a": 1, "b": [1, 2]}) != make_key({"a": 1, "b": [2, 1]})
+
+
+def test_empty_responses_are_cached(tmp_path):
+    cache = sentiment.ResponseCache(tmp_path / "cache.sqlite")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_set({"query": "iskrem"}, compute) is None
+    assert cache.get_or_set({"query": "iskrem"}, compute) is None
+    assert len(calls) == 1
+    assert cache.get("missing") is None
+
+
+def test_threads_share_one_client(tmp_path, monkeypatch):
+    caches = []
+    response_cache = sentiment.ResponseCache
+
+    def make_cache():
+        caches.append(response_cache(tmp_path / "cache.sqlite"))
+        return caches[-1]
+
+    monkeypatch.setattr(sentiment, "ResponseCache", make_cache)
+    monkeypatch.setattr(sentiment, "_client", None)
+    monkeypatch.setattr(sentiment, "_response_cache", None)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: sentiment.get_client(), range(32)))
+
+    assert len({id(client) for client in clients}) == 1
+    assert len(caches) == 1
+    assert clients[0].cache is caches[0]
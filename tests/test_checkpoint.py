@@ -0,0 +1,131 @@
+import json
+
+import pytest
+import requests
+
+import sentiment
+from tests.helpers import StubClient, make_corpus
+
+
+class UndercountingClient(StubClient):
+    """Reports one hit per document, so the planned concordance limits are too low."""
+
+    def __init__(self):
+        super().__init__()
+        self.conc_requests = 0
+
+    def post(self, endpoint, json=None, use_cache=True):
+        result = super().post(endpoint, json, use_cache)
+        if endpoint == "frequencies":
+            return [[docid, word, 1, urncount] for docid, word, _, urncount in result]
+        if endpoint == "conc":
+            self.conc_requests += 1
+        return result
+
+
+class Interrupted(Exception):
+    pass
+
+
+def count_and_score(corpus, lexicon, checkpoint_dir):
+    return sentiment.count_and_score_target_words(
+        corpus, "iskrem", lexicon=lexicon, batch_size=20, checkpoint_dir=checkpoint_dir
+    )
+
+
+def test_truncated_batches_are_fetched_again(tmp_path, stub_client, lexicon):
+    corpus = make_corpus(60)
+    complete = sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=lexicon)
+    client = UndercountingClient()
+    sentiment.set_client(client)
+
+    undercounted = sentiment.count_and_score_target_words(
+        corpus, "iskrem", lexicon=lexicon, batch_size=20
+    )
+    assert len(undercounted) == len(complete)
+    assert undercounted.attrs["plan"]["refetched_requests"] > 0
+    assert undercounted.attrs["plan"]["truncated_batches"] == 0
+
+    checkpointed = count_and_score(corpus, lexicon, tmp_path)
+    requests_sent = client.conc_requests
+    resumed = count_and_score(corpus, lexicon, tmp_path)
+    assert len(checkpointed) == len(resumed) == len(complete)
+    assert client.conc_requests == requests_sent
+
+
+def test_documents_beyond_max_concordances_stay_truncated(tmp_path, stub_client, lexicon):
+    corpus = make_corpus(60)
+    complete = sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=lexicon)
+    capped = sentiment.count_and_score_target_words(
+        corpus, "iskrem", lexicon=lexicon, max_concordances=4
+    )
+    per_document = complete.groupby("dhlabid").size()
+    # a document with as many concordances as the limit may be truncated too
+    assert capped.attrs["plan"]["truncated_batches"] == (per_document >= 4).sum()
+    assert (per_document > 4).any()
+    assert capped.groupby("dhlabid").size().to_dict() == per_document.clip(upper=4).to_dict()
+
+    options = dict(lexicon=lexicon, max_concordances=4, checkpoint_dir=tmp_path)
+    checkpointed = sentiment.count_and_score_target_words(corpus, "iskrem", **options)
+    assert checkpointed.attrs["plan"] == capped.attrs["plan"]
+
+    # a rerun with a higher limit doesn't reuse the truncated batches
+    options["max_concordances"] = 20_000
+    rerun = sentiment.count_and_score_target_words(corpus, "iskrem", **options)
+    assert rerun.groupby("dhlabid").size().to_dict() == per_document.to_dict()
+
+
+def test_checkpoint_resume_scores_only_the_rest(tmp_path, stub_client, lexicon):
+    corpus = make_corpus(100)
+    options = dict(lexicon=lexicon, batch_size=20, checkpoint_dir=tmp_path)
+
+    def interrupt(done, total):
+        if done >= 40:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        sentiment.count_and_score_target_words(corpus, "iskrem", progress=interrupt, **options)
+
+    resumed_progress = []
+    resumed = sentiment.count_and_score_target_words(
+        corpus, "iskrem", progress=lambda done, total: resumed_progress.append(total), **options
+    )
+    complete = sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=lexicon)
+
+    assert resumed_progress[-1] == 60
+    assert resumed.attrs["plan"]["documents"] == 60
+    columns = ["dhlabid", "positive", "negative"]
+    key = lambda df: df[columns].sort_values(columns).reset_index(drop=True)
+    assert key(resumed).equals(key(complete))
+
+
+class BrokenFrequenciesClient(StubClient):
+    """Answers the frequencies of the second batch of documents with a body that isn't json."""
+
+    def post(self, endpoint, json=None, use_cache=True):
+        if endpoint == "frequencies" and "URN:NBN:no-nb_digavis_synthetic_20" in json["urns"]:
+            raise requests.exceptions.JSONDecodeError("Expecting value", "<html>", 0)
+        return super().post(endpoint, json, use_cache)
+
+
+def test_failed_frequencies_are_not_checkpointed_as_without_hits(tmp_path, monkeypatch, lexicon):
+    corpus = make_corpus(60)
+    monkeypatch.setattr(sentiment, "_client", BrokenFrequenciesClient())
+    with pytest.raises(requests.exceptions.JSONDecodeError):
+        count_and_score(corpus, lexicon, tmp_path)
+
+    monkeypatch.setattr(sentiment, "_client", StubClient())
+    resumed = count_and_score(corpus, lexicon, tmp_path)
+
+    assert resumed.dhlabid.nunique() == 60
+
+
+def test_a_checkpoint_made_with_other_options_is_not_resumed(tmp_path, stub_client, lexicon):
+    corpus = make_corpus(20)
+    count_and_score(corpus, lexicon, tmp_path)
+    (manifest_file,) = tmp_path.glob("*/manifest.json")
+    manifest = json.loads(manifest_file.read_text())
+    manifest_file.write_text(json.dumps({**manifest, "windows": [5]}))
+
+    with pytest.raises(ValueError, match="other windows"):
+        count_and_score(corpus, lexicon, tmp_path)
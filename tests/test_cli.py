@@ -0,0 +1,161 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import sentiment
+from tests.helpers import StubClient, make_corpus
+
+ROOT = Path(__file__).resolve().parents[1]
+
+CHILD = """
+import json, sys
+import sentiment
+from tests.helpers import StubClient
+base_url = sentiment.DhlabClient().base_url
+sentiment.set_client(StubClient())
+code = sentiment.main(sys.argv[1:])
+modules = [m for m in ("dhlab.text", "matplotlib", "scipy", "streamlit") if m in sys.modules]
+print(json.dumps({"code": code, "modules": modules, "base_url": base_url}))
+"""
+
+
+def run_cli(tmp_path, lexicon, args) -> dict:
+    """Run the command line in a fresh process with the stub client, and report what it imported."""
+    sentiment.save_lexicon(lexicon, tmp_path / "benchmark.json.gz")
+    env = dict(
+        os.environ,
+        PYTHONPATH=str(ROOT),
+        SENTIMENT_LEXICON_DIR=str(tmp_path),
+        SENTIMENT_CACHE_DIR=str(tmp_path),
+    )
+    run = subprocess.run(
+        [sys.executable, "-c", CHILD, *args, "--lexicon", "benchmark"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(run.stdout.splitlines()[-1])
+
+
+def test_cli_streams_results_without_heavy_imports(tmp_path, lexicon):
+    corpus_file = tmp_path / "corpus.csv"
+    make_corpus(120).to_csv(corpus_file, index=False)
+    output = tmp_path / "result.csv.gz"
+
+    report = run_cli(tmp_path, lexicon, ["iskrem", "--corpus", str(corpus_file), "-o", str(output)])
+
+    assert report == {"code": 0, "modules": [], "base_url": "https://api.nb.no/dhlab"}
+    result = pd.read_csv(output)
+    assert set(result.word) == {"iskrem"}
+    assert result.dhlabid.nunique() == 120
+
+
+def test_cli_builds_the_corpus_without_heavy_imports(tmp_path, lexicon):
+    output = tmp_path / "result.csv"
+    args = ["iskrem", "--city", "Oslo", "--from-year", "2000", "--limit", "80", "-o", str(output)]
+
+    report = run_cli(tmp_path, lexicon, args)
+
+    assert report["code"] == 0
+    assert report["modules"] == []
+    assert pd.read_csv(output).dhlabid.nunique() == 80
+
+
+class RecordingClient(StubClient):
+    """Keeps the endpoint and payload of each POST request."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def post(self, endpoint, json=None, use_cache=True):
+        self.requests.append((endpoint, json))
+        return super().post(endpoint, json, use_cache)
+
+
+@pytest.mark.parametrize("stub_client", [RecordingClient], indirect=True)
+def test_corpus_filters_are_sent_like_dh_corpus(stub_client):
+    args = ["iskrem", "skole", "--city", "Oslo", "--to-year", "2010", "-o", "x.csv"]
+    corpus = sentiment.load_cli_corpus(sentiment.parse_args(args))
+    unfiltered = sentiment.load_corpus(limit=5)
+
+    assert stub_client.requests == [
+        (
+            "build_corpus",
+            {
+                "doctype": "digavis",
+                "fulltext": "iskrem OR skole",
+                "freetext": "city: Oslo",
+                "to_year": 2010,
+                "limit": 1000,
+                "order_by": "random",
+            },
+        )
+    ]
+    assert len(corpus) == 1000
+    # like dh.Corpus, no filters give an empty corpus without a request
+    assert unfiltered.empty and unfiltered.columns.tolist() == ["urn"]
+
+
+class NoHitsClient(StubClient):
+    """Finds the keywords in none of the documents."""
+
+    def post(self, endpoint, json=None, use_cache=True):
+        return [] if endpoint == "frequencies" else super().post(endpoint, json, use_cache)
+
+
+@pytest.mark.parametrize("stub_client", [NoHitsClient], indirect=True)
+@pytest.mark.parametrize("suffix", [".csv", ".csv.gz", ".parquet", ".xlsx"])
+def test_cli_writes_a_file_without_hits(tmp_path, monkeypatch, stub_client, lexicon, suffix):
+    monkeypatch.setattr(sentiment, "LEXICON_DIR", tmp_path)
+    sentiment.save_lexicon(lexicon, tmp_path / "benchmark.json.gz")
+    corpus_file = tmp_path / "corpus.csv"
+    make_corpus(20).to_csv(corpus_file, index=False)
+    output = tmp_path / f"result{suffix}"
+    args = ["iskrem", "--corpus", str(corpus_file), "--lexicon", "benchmark", "-o", str(output)]
+    args += ["--windows", "5", "--cube", str(tmp_path / "cube.parquet")]
+
+    assert sentiment.main(args) == 0
+    read = {".parquet": pd.read_parquet, ".xlsx": pd.read_excel}.get(suffix, pd.read_csv)
+    result = read(output)
+    assert result.empty
+    assert list(result.columns) == sentiment.result_columns(make_corpus(1).columns, [5])
+    assert sentiment.SentimentCube.load(tmp_path / "cube.parquet").frame.empty
+
+
+class FailingClient(StubClient):
+    """Fails to count the keywords after the first batch."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = 0
+
+    def post(self, endpoint, json=None, use_cache=True):
+        if endpoint == "frequencies":
+            self.batches += 1
+            if self.batches > 1:
+                raise ConnectionError("API down")
+        return super().post(endpoint, json, use_cache)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".xlsx"])
+@pytest.mark.parametrize(
+    "client_class, documents", [(FailingClient, 50), (StubClient, 0)], ids=["mid-way", "empty-corpus"]
+)
+def test_cli_leaves_no_file_when_it_fails(
+    tmp_path, monkeypatch, lexicon, suffix, client_class, documents
+):
+    monkeypatch.setattr(sentiment, "LEXICON_DIR", tmp_path)
+    monkeypatch.setattr(sentiment, "_client", client_class())
+    sentiment.save_lexicon(lexicon, tmp_path / "benchmark.json.gz")
+    corpus_file = tmp_path / "corpus.csv"
+    make_corpus(documents).to_csv(corpus_file, index=False)
+    output = tmp_path / f"result{suffix}"
+    args = ["iskrem", "--corpus", str(corpus_file), "--lexicon", "benchmark", "-o", str(output)]
+    args += ["--batch-size", "10", "--no-cache"]
+
+    assert sentiment.main(args) == 1
+    assert list(tmp_path.glob("result*")) == []
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import sentiment
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answer each request with the next (status, body) of the server's script for its path."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, payload))
+        script = self.server.scripts.get(self.path, [(404, {"error": "not found"})])
+        status, body = script.pop(0) if len(script) > 1 else script[0]
+        data = json.dumps(body(payload) if callable(body) else body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    httpd.scripts = {}
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_client(server, **kwargs):
+    return sentiment.DhlabClient(base_url=server.url, backoff=0, **kwargs)
+
+
+def test_retries_transient_errors(server):
+    server.scripts["/frequencies"] = [(503, {}), (503, {}), (200, [[1, "skole", 2, 100]])]
+    client = make_client(server)
+
+    assert client.post("frequencies", {"urns": ["x"]}) == [[1, "skole", 2, 100]]
+    assert len(server.requests) == 3
+
+
+def test_gives_up_after_the_last_retry(server):
+    server.scripts["/frequencies"] = [(503, {})]
+    client = make_client(server, retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        client.post("frequencies", {"urns": ["x"]})
+    assert len(server.requests) == 3
+
+
+def test_does_not_retry_client_errors(server):
+    client = make_client(server)
+
+    with pytest.raises(requests.HTTPError) as error:
+        client.post("missing", {})
+    assert error.value.response.status_code == 404
+    assert len(server.requests) == 1
+
+
+def test_apost_many_keeps_the_order_of_the_payloads(server):
+    server.scripts["/echo"] = [(200, lambda payload: payload["i"])]
+    client = make_client(server)
+
+    payloads = [{"i": i} for i in range(20)]
+    assert asyncio.run(client.apost_many("echo", payloads)) == list(range(20))
+
+
+def test_concordances_and_frequencies_use_the_shared_client(server, monkeypatch):
+    server.scripts["/conc"] = [
+        (200, [{"docid": 1, "urn": "URN:NBN:no-nb_digavis_1", "conc": "en <b>skole</b> her"}])
+    ]
+    server.scripts["/frequencies"] = [(200, [[1, "skole", 3, 100]])]
+    monkeypatch.setattr(sentiment, "_client", make_client(server))
+    conc = sentiment.fetch_concordances(["URN:NBN:no-nb_digavis_1"], "skole", use_cache=False)
+    freq = sentiment.count_terms_in_doc(["URN:NBN:no-nb_digavis_1"], ["skole"], use_cache=False)
+
+    assert conc.conc.tolist() == ["en <b>skole</b> her"]
+    assert [path for path, _ in server.requests] == ["/conc", "/frequencies"]
+    assert len(freq) == 1
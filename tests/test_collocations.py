@@ -0,0 +1,43 @@
+import pandas as pd
+
+import sentiment
+
+LEXICON = sentiment.Lexicon(
+    name="coll",
+    positive=frozenset(["glad", "god", "rar"]),
+    negative=frozenset(["trist", "rar"]),
+)
+
+
+def collocation():
+    return pd.Series(
+        [2, 3, 4, 5, 6, 7], index=["Glad", "glad", "trist", "rar", "skolen", "1952"], name="counts"
+    )
+
+
+def test_terms_are_split_into_positive_negative_and_neutral():
+    df = sentiment.coll_sentiment(collocation(), "iskrem", lexicon=LEXICON)
+
+    # indexed by the lowercased terms, and a term in both lists is in both groups
+    assert list(df.index) == ["glad", "rar", "rar", "trist", "skolen"]
+    assert df.sentiment.tolist() == ["pos", "pos", "neg", "neg", "neutral"]
+    assert df.counts.tolist() == [5, 5, 5, 4, 6]
+    # lexicon terms are never neutral
+    assert df.loc[df.sentiment == "neutral"].index.tolist() == ["skolen"]
+
+    assert sentiment.coll_sentiment(
+        collocation(), "iskrem", return_score_only=True, lexicon=LEXICON
+    ) == (10, 9)
+
+
+def test_coll_sentiment_many(monkeypatch):
+    colls = {"iskrem": collocation(), "tom": pd.Series(dtype="int64", name="counts")}
+    monkeypatch.setattr(sentiment, "fetch_collocation", lambda urns, word, *args: colls[word])
+    corpus = pd.DataFrame({"urn": ["URN:NBN:no-nb_digavis_1", "URN:NBN:no-nb_digavis_2"]})
+
+    df = sentiment.coll_sentiment_many(corpus, ["iskrem", "tom"], lexicon=LEXICON)
+
+    assert df.index.names == ["word", "term"]
+    assert set(df.index.get_level_values("word")) == {"iskrem"}
+    expected = sentiment.coll_sentiment(collocation(), "iskrem", lexicon=LEXICON)
+    assert df.loc["iskrem"].equals(expected)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+import sentiment
+
+
+def test_compact_frame_dtypes():
+    df = sentiment.compact_frame(
+        pd.DataFrame(
+            {
+                "city": ["Oslo", "Oslo", "Oslo", "Bergen"],
+                "conc": ["a", "b", "c", "d"],
+                "count": [1, 2, 3, 4],
+                "dhlabid": [1_000_000, 1_000_001, 1_000_002, 1_000_003],
+                "score": [0.5, 1.5, 2.5, 3.5],
+            }
+        )
+    )
+    assert isinstance(df.city.dtype, pd.CategoricalDtype)
+    assert df.conc.dtype == sentiment.string_dtype()
+    assert df["count"].dtype == np.int8
+    assert df.dhlabid.dtype == np.int32
+    assert df.score.dtype == np.float64
+
+
+def test_concat_compact_merges_categories_and_integer_widths():
+    first = sentiment.compact_frame(
+        pd.DataFrame(
+            {"city": ["Oslo", "Oslo", "Bergen", "Bergen"], "count": [1, 2, 3, 4], "note": None}
+        )
+    )
+    second = sentiment.compact_frame(
+        pd.DataFrame({"city": ["Tromsø", "Tromsø", "Molde", "Molde"], "count": [1, 300, 70_000, 2]})
+    )
+    assert first["count"].dtype == np.int8 and second["count"].dtype == np.int32
+
+    df = sentiment.concat_compact([first, second])
+    assert list(df.columns) == ["city", "count"]
+    assert isinstance(df.city.dtype, pd.CategoricalDtype)
+    assert set(df.city.cat.categories) == {"Bergen", "Molde", "Oslo", "Tromsø"}
+    assert df.city.tolist() == ["Oslo", "Oslo", "Bergen", "Bergen"] + ["Tromsø"] * 2 + ["Molde"] * 2
+    assert df["count"].dtype == np.int32
+    assert df["count"].tolist() == [1, 2, 3, 4, 1, 300, 70_000, 2]
+
+
+def test_concat_compact_keeps_categories_of_a_column_that_is_text_in_one_batch():
+    first = sentiment.compact_frame(pd.DataFrame({"title": ["vg", "vg", "vg", "vg"]}))
+    second = sentiment.compact_frame(pd.DataFrame({"title": ["adressa", "aftenposten"]}))
+    assert not isinstance(second.title.dtype, pd.CategoricalDtype)
+
+    df = sentiment.concat_compact([first, second])
+    assert isinstance(df.title.dtype, pd.CategoricalDtype)
+    assert df.title.tolist() == ["vg"] * 4 + ["adressa", "aftenposten"]
+
+
+def test_concat_compact_keeps_the_columns_of_empty_frames():
+    empty = pd.DataFrame(columns=sentiment.result_columns(["dhlabid", "year"], [5]))
+
+    df = sentiment.concat_compact([empty, empty])
+
+    assert df.empty
+    assert list(df.columns) == list(empty.columns)
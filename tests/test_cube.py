@@ -0,0 +1,57 @@
+import pandas as pd
+
+import sentiment
+from tests.helpers import make_corpus
+
+
+def test_cube_counts_documents_and_frequencies_once(stub_client, lexicon):
+    df = sentiment.count_and_score_target_words(make_corpus(300), "iskrem", lexicon=lexicon)
+    documents = df.drop_duplicates(["dhlabid", "word"])
+    assert len(df) > len(documents)
+
+    cube = sentiment.SentimentCube.from_result(df)
+    totals = cube.query("word").loc["iskrem"]
+    assert totals["documents"] == len(documents)
+    assert totals["count"] == documents["count"].sum()
+    assert totals["positive"] == df.positive.sum()
+    assert totals["sentimentscore"] == df.sentimentscore.sum()
+
+    by_year = cube.query("year")
+    assert by_year["count"].to_dict() == documents.groupby("year")["count"].sum().to_dict()
+
+
+def test_cube_of_batches_equals_cube_of_result(stub_client, lexicon):
+    df = sentiment.count_and_score_target_words(make_corpus(300), "iskrem", lexicon=lexicon)
+    documents = df.dhlabid.unique()
+    parts = [
+        sentiment.SentimentCube.from_result(df[df.dhlabid.isin(documents[i : i + 50])])
+        for i in range(0, len(documents), 50)
+    ]
+    combined = sentiment.SentimentCube.concat(parts).query(["city", "year"])
+    assert combined.equals(sentiment.SentimentCube.from_result(df).query(["city", "year"]))
+
+
+def test_query_filters_by_single_values_and_lists(stub_client, lexicon):
+    df = sentiment.count_and_score_target_words(make_corpus(300), "iskrem", lexicon=lexicon)
+    df["title"] = df.title.astype(str).replace("adressa", "Adresseavisen, Trondheim")
+    cube = sentiment.SentimentCube.from_result(df)
+
+    by_month = cube.query("month", year=2001)
+    assert by_month.sentimentscore.sum() == df.sentimentscore[df.year == 2001].sum()
+
+    trondheim = cube.query("year", title="Adresseavisen, Trondheim")
+    assert trondheim.positive.sum() == df.positive[df.title == "Adresseavisen, Trondheim"].sum()
+    assert trondheim.positive.sum() > 0
+
+    years = cube.query("city", year=(2001, 2002), city={"Oslo"})
+    selected = df[df.year.isin([2001, 2002]) & (df.city == "Oslo")]
+    assert years.negative.to_dict() == {"Oslo": selected.negative.sum()}
+
+
+def test_concat_of_empty_cubes_keeps_the_dimensions():
+    empty = sentiment.SentimentCube.from_result(
+        pd.DataFrame(columns=sentiment.result_columns(make_corpus(1).columns))
+    )
+    combined = sentiment.SentimentCube.concat([empty, empty])
+    assert combined.dimensions == sentiment.CUBE_DIMENSIONS
+    assert combined.query("year").empty
@@ -0,0 +1,79 @@
+import gzip
+from io import BytesIO
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import sentiment
+
+
+def batches():
+    """Two result batches with different categories and integer widths, like from compact_frame."""
+    first = pd.DataFrame(
+        {"city": ["Oslo", "Oslo", "Bergen"], "word": ["iskrem"] * 3, "count": [1, 2, 3]}
+    )
+    second = pd.DataFrame(
+        {"city": ["Tromsø", "Molde"], "word": ["iskrem", "skole"], "count": [70_000, 5]}
+    )
+    first = first.astype({"city": "category", "word": "category", "count": "int8"})
+    second = second.astype({"city": "category", "word": "category", "count": "int32"})
+    return [first, second]
+
+
+def expected():
+    frames = [df.astype({"city": str, "word": str, "count": "int64"}) for df in batches()]
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_parquet_batches_get_one_schema(tmp_path):
+    with sentiment.ResultWriter(tmp_path / "result.parquet") as writer:
+        for df in batches():
+            writer.write(df)
+    assert writer.rows == 5
+
+    result = pd.read_parquet(tmp_path / "result.parquet")
+    assert result.astype({"city": str, "word": str}).equals(expected())
+    assert result["count"].dtype == "int64"
+
+
+def test_excel_rows_continue_on_a_new_sheet(tmp_path):
+    df = pd.DataFrame({"dhlabid": range(12), "word": "iskrem"})
+    with sentiment.ResultWriter(tmp_path / "result.xlsx") as writer:
+        writer.excel_max_rows = 5
+        writer.write(df.iloc[:7])
+        writer.write(df.iloc[7:])
+
+    workbook = openpyxl.load_workbook(tmp_path / "result.xlsx", read_only=True)
+    assert workbook.sheetnames == ["Sheet1", "Sheet2", "Sheet3"]
+    sheets = pd.read_excel(tmp_path / "result.xlsx", sheet_name=None)
+    assert [len(sheet) for sheet in sheets.values()] == [4, 4, 4]
+    assert pd.concat(sheets.values(), ignore_index=True).equals(df)
+
+
+@pytest.mark.parametrize("file_format", [".csv", ".csv.gz"])
+def test_csv_to_a_buffer_leaves_it_open(file_format):
+    buffer = BytesIO()
+    with sentiment.ResultWriter(buffer, file_format) as writer:
+        for df in batches():
+            writer.write(df)
+
+    assert not buffer.closed
+    content = buffer.getvalue()
+    if file_format == ".csv.gz":
+        content = gzip.decompress(content)
+    assert pd.read_csv(BytesIO(content)).equals(expected())
+
+
+@pytest.mark.parametrize("file_format", [".csv", ".csv.gz", ".parquet", ".xlsx"])
+def test_export_bytes(file_format):
+    df = expected()
+    content = sentiment.export_bytes(df, file_format, chunksize=2)
+    if file_format == ".parquet":
+        result = pd.read_parquet(BytesIO(content))
+    elif file_format == ".xlsx":
+        result = pd.read_excel(BytesIO(content))
+    else:
+        compression = "gzip" if file_format == ".csv.gz" else None
+        result = pd.read_csv(BytesIO(content), compression=compression)
+    assert result.astype({"city": str, "word": str}).equals(df)
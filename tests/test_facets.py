@@ -0,0 +1,95 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import sentiment
+
+
+class Corpora:
+    """Stands in for ``load_corpus``: one document per year of a range or single year, none for Molde."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, use_cache=True, **params):
+        with self._lock:
+            self.calls.append(params)
+        if "city: Molde" in params.get("freetext", ""):
+            return pd.DataFrame(columns=["urn"])
+        years = params.get("to_year", 1) - params.get("from_year", 0)
+        return pd.DataFrame({"urn": [f"URN:NBN:no-nb_digavis_{i}" for i in range(years)]})
+
+
+def collocation(urns, word, use_cache=True):
+    """Two positive terms per document and one negative term."""
+    return pd.Series([len(urns), len(urns), 1], index=["glad", "God", "trist"], name="counts")
+
+
+@pytest.fixture
+def corpora(monkeypatch, lexicon):
+    corpora = Corpora()
+    monkeypatch.setattr(sentiment, "load_corpus", corpora)
+    monkeypatch.setattr(sentiment, "fetch_collocation", collocation)
+    monkeypatch.setattr(sentiment, "load_lexicon", lambda *args, **kwargs: lexicon)
+    return corpora
+
+
+def test_facet_corpus_params():
+    params = sentiment.facet_corpus_params(
+        {"city": "Bergen", "year": 2001, "title": "bergenstidende"},
+        freetext="lang: nob",
+        doctype="digavis",
+    )
+    assert params == {
+        "freetext": "lang: nob city: Bergen year: 2001",
+        "title": "bergenstidende",
+        "doctype": "digavis",
+    }
+
+    params = sentiment.facet_corpus_params({"city": "Bergen", "year": (1999, 2005)}, limit=10)
+    assert params == {"freetext": "city: Bergen", "from_year": 1999, "to_year": 2005, "limit": 10}
+    assert sentiment.facet_corpus_params({"title": "vg"}) == {"title": "vg"}
+
+
+def test_sentiment_by_facets(corpora, lexicon):
+    df = sentiment.sentiment_by_facets(
+        "iskrem",
+        {"city": ["Bergen", "Molde"], "year": [(1999, 2005), (2005, 2007)]},
+        lexicon=lexicon,
+        doctype="digavis",
+    )
+
+    assert df.index.names == ["city", "year"]
+    assert df.index.tolist() == [
+        ("Bergen", "1999-2005"),
+        ("Bergen", "2005-2007"),
+        ("Molde", "1999-2005"),
+        ("Molde", "2005-2007"),
+    ]
+    assert df.loc[("Bergen", "1999-2005")].tolist() == [12, 1, 11, 6]
+    assert df.loc[("Bergen", "2005-2007")].tolist() == [4, 1, 3, 2]
+    # a facet without documents is scored as 0 without fetching a collocation
+    assert (df.loc["Molde"] == 0).all().all()
+    assert all(call["doctype"] == "digavis" and call["limit"] == 1000 for call in corpora.calls)
+
+
+def test_sentiment_by_place_yields_a_yearly_frame_per_city(corpora):
+    frames = list(sentiment.sentiment_by_place(["Bergen", "Molde"], 2000, 2003, "iskrem"))
+
+    assert len(frames) == 2
+    for frame in frames:
+        assert frame.index.name == "year"
+        assert frame.index.tolist() == [2000, 2001, 2002]
+        assert frame.columns.tolist() == ["positive", "negative", "sum"]
+    bergen, molde = frames
+    assert bergen.values.tolist() == [[2, 1, 1]] * 3
+    assert (molde == 0).all().all()
+    # single years are freetext queries, not year ranges
+    assert sorted(call["freetext"] for call in corpora.calls)[:3] == [
+        "city: Bergen year: 2000",
+        "city: Bergen year: 2001",
+        "city: Bergen year: 2002",
+    ]
+    assert not any("from_year" in call for call in corpora.calls)
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+import sentiment
+from tests.helpers import StubClient, make_corpus
+
+
+class GatedClient(StubClient):
+    """Holds back the concordances until ``gate`` is opened, and fails for the word ``feil``."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def post(self, endpoint, json=None, use_cache=True):
+        if endpoint == "frequencies" and "feil" in json["words"]:
+            raise RuntimeError("frequencies are down")
+        if endpoint == "conc":
+            assert self.gate.wait(10)
+        return super().post(endpoint, json, use_cache)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = GatedClient()
+    monkeypatch.setattr(sentiment, "_client", client)
+    yield client
+    client.gate.set()
+
+
+@pytest.fixture
+def queue():
+    queue = sentiment.JobQueue(workers=1, max_finished=2)
+    yield queue
+    queue.shutdown()
+
+
+def test_identical_requests_share_a_job(client, queue, lexicon):
+    corpus = make_corpus(40)
+    job = queue.submit(corpus, "iskrem", lexicon=lexicon, batch_size=10)
+    assert queue.submit(corpus, "iskrem", lexicon=lexicon, batch_size=10) is job
+    assert job.subscribers == 2
+    other = queue.submit(corpus, "iskrem", lexicon=lexicon, batch_size=20)
+    assert other is not job
+
+    client.gate.set()
+    df = job.result(timeout=10)
+    assert job.status == "done" and job.progress == 1.0
+    assert job.cube.query("word").loc["iskrem", "documents"] == df.dhlabid.nunique()
+    # a finished job is reused as a cached result
+    assert queue.submit(corpus, "iskrem", lexicon=lexicon, batch_size=10) is job
+    assert job.subscribers == 2
+
+
+def test_a_job_is_cancelled_when_the_last_subscriber_cancels(client, queue, lexicon):
+    corpus = make_corpus(40)
+    job = queue.submit(corpus, "iskrem", lexicon=lexicon, batch_size=10)
+    queue.submit(corpus, "iskrem", lexicon=lexicon, batch_size=10)
+
+    queue.cancel(job)
+    assert not job.cancel_requested
+    queue.cancel(job)
+    assert job.cancel_requested
+    assert queue.submit(corpus, "iskrem", lexicon=lexicon, batch_size=10) is not job
+
+    client.gate.set()
+    with pytest.raises(sentiment.JobCancelled):
+        job.result(timeout=10)
+    assert job.status == "cancelled"
+
+
+def test_a_queued_job_is_cancelled_before_it_runs(client, queue, lexicon):
+    corpus = make_corpus(40)
+    running = queue.submit(corpus, "iskrem", lexicon=lexicon)
+    queued = queue.submit(corpus, "skole", lexicon=lexicon)
+    assert queued.status == "queued"
+
+    queue.cancel(queued)
+    assert queued.status == "cancelled"
+    with pytest.raises(sentiment.JobCancelled):
+        queued.result(timeout=10)
+    client.gate.set()
+    assert running.result(timeout=10).dhlabid.nunique() == 40
+
+
+def test_a_failed_job_is_not_reused(client, queue, lexicon):
+    corpus = make_corpus(10)
+    job = queue.submit(corpus, "feil", lexicon=lexicon)
+    with pytest.raises(RuntimeError):
+        job.result(timeout=10)
+    assert job.status == "failed"
+    assert queue.submit(corpus, "feil", lexicon=lexicon) is not job
+
+
+def test_only_the_most_recently_finished_jobs_are_kept(client, queue, lexicon):
+    client.gate.set()
+    corpus = make_corpus(10)
+    jobs = []
+    for word in ["iskrem", "skole", "sykehus", "barnehage"]:
+        jobs.append(queue.submit(corpus, word, lexicon=lexicon))
+        jobs[-1].result(timeout=10)
+
+    # the oldest finished job is evicted when the fourth one is submitted
+    assert queue.jobs() == jobs[1:]
+    assert queue.submit(corpus, "skole", lexicon=lexicon) is jobs[1]
+    assert queue.submit(corpus, "iskrem", lexicon=lexicon) is not jobs[0]
+
+
+def test_job_key_ignores_runtime_options(lexicon):
+    corpus = make_corpus(10)
+    key = sentiment.JobQueue.job_key
+    assert key(corpus, "iskrem", lexicon=lexicon, memo=sentiment.ScoreMemo()) == key(
+        corpus, "iskrem", lexicon=lexicon, memo=sentiment.ScoreMemo(), progress=print
+    )
+    assert key(corpus, "iskrem", lexicon=lexicon, window=20) != key(corpus, "iskrem", lexicon=lexicon)
+    with pytest.raises(TypeError, match="JSON serializable"):
+        key(corpus, "iskrem", lexicon=lexicon, window=object())
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+import sentiment
+from tests.helpers import StubClient, make_corpus, make_snippet
+
+
+class MultiKeywordClient(StubClient):
+    """Marks one of the keywords of an ``OR`` query in bold in each concordance."""
+
+    def post(self, endpoint, json=None, use_cache=True):
+        if endpoint != "conc":
+            return super().post(endpoint, json, use_cache)
+        words = json["query"].split(" OR ")
+        rows = []
+        for urn in json["urns"]:
+            docid, rng, n = self._doc(urn)
+            rows += [
+                {"docid": docid, "urn": urn, "conc": make_snippet(rng, rng.choice(words))}
+                for _ in range(n)
+            ]
+        return rows[: json["limit"]]
+
+
+def test_match_keywords():
+    conc = pd.DataFrame(
+        {
+            "dhlabid": [1, 2, 3, 4],
+            "conc": [
+                "en <b>Skole</b> her",
+                "<b>skolen</b> og <b>sykehus</b>",
+                "ingen treff på skole",
+                "<b>sykehuset</b>",
+            ],
+        }
+    )
+    matched = sentiment.match_keywords(conc, ["skole", "sykehus*"])
+    assert matched[["dhlabid", "word"]].values.tolist() == [
+        [1, "skole"],
+        [2, "sykehus*"],
+        [4, "sykehus*"],
+    ]
+
+
+@pytest.mark.parametrize("stub_client", [MultiKeywordClient], indirect=True)
+def test_several_keywords_in_one_pass(stub_client, lexicon):
+    df = sentiment.count_and_score_target_words(
+        make_corpus(100), ["iskrem", "skole"], lexicon=lexicon, batch_size=30
+    )
+
+    # every concordance of the stub has exactly one of the keywords in bold
+    assert set(df.word) == {"iskrem", "skole"}
+    concordances = sum(StubClient()._doc(urn)[2] for urn in make_corpus(100).urn)
+    assert len(df) == concordances
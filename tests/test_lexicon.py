@@ -0,0 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import sentiment
+
+
+def test_concurrent_saves_leave_a_readable_lexicon(tmp_path, lexicon):
+    path = tmp_path / "benchmark.json.gz"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: sentiment.save_lexicon(lexicon, path), range(32)))
+
+    assert sentiment.read_lexicon(path) == lexicon
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
@@ -0,0 +1,18 @@
+import pytest
+
+import sentiment
+from tests.helpers import make_snippets
+from tests.matcher_cases import LEXICON, SNIPPETS
+
+
+@pytest.mark.parametrize("text", SNIPPETS + make_snippets(500))
+def test_matcher_counts_like_the_tokenizer(text):
+    positive, negative = LEXICON.as_frames()
+    expected = tuple(int(c) for c in sentiment.score_sentiment(text, positive, negative))
+    assert sentiment.LexiconMatcher(LEXICON).count(text) == expected
+
+
+def test_count_many_matches_count():
+    matcher = sentiment.LexiconMatcher(LEXICON)
+    texts = SNIPPETS + make_snippets(50)
+    assert matcher.count_many(texts).tolist() == [list(matcher.count(t)) for t in texts]
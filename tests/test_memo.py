@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+import sentiment
+from tests.helpers import make_snippet
+
+
+def test_memo_scores_duplicates_once(tmp_path, lexicon):
+    rng = random.Random(1)
+    distinct = [make_snippet(rng) for _ in range(50)]
+    texts = distinct * 3
+    expected = sentiment.score_snippets(texts, lexicon)
+
+    memo = sentiment.ScoreMemo(path=tmp_path / "scores.sqlite")
+    assert memo.score(texts, lexicon).equals(expected)
+    assert memo.stats()["scored"] == 50
+    assert memo.stats()["duplicate_rate"] == pytest.approx(2 / 3)
+
+    reopened = sentiment.ScoreMemo(path=tmp_path / "scores.sqlite")
+    assert reopened.score(texts, lexicon).equals(expected)
+    assert reopened.stats()["scored"] == 0
+    assert reopened.stats()["persisted_hits"] == 50
+
+    other = sentiment.Lexicon(name="other", positive=lexicon.negative, negative=lexicon.positive)
+    reopened.score(distinct, other)
+    assert reopened.stats()["scored"] == 50
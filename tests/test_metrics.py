@@ -0,0 +1,33 @@
+import math
+
+import numpy as np
+import pytest
+
+import sentiment
+
+
+@pytest.mark.skipif(
+    math.isnan(sentiment.resident_memory_mb()), reason="resident memory is read from /proc"
+)
+def test_memory_is_measured_per_stage():
+    with sentiment.collect_metrics() as metrics:
+        with sentiment.stage("allocate"):
+            kept = np.ones(25_000_000)
+        with sentiment.stage("after"):
+            pass
+    memory = metrics.to_frame().memory_mb
+    assert memory["allocate"] > 150
+    assert abs(memory["after"]) < 50
+    del kept
+
+
+def test_prometheus_output_has_one_sample_per_stage_and_column():
+    metrics = sentiment.PipelineMetrics()
+    metrics.add("fetch", 1.5, rows=10, nbytes=2000, memory=12.5)
+    metrics.add("fetch", 0.5, rows=5, nbytes=1000, memory=3.0)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'sentiment_stage_rows_total{stage="fetch"} 15' in lines
+    assert 'sentiment_stage_memory_mb{stage="fetch"} 12.5' in lines
+    assert "# TYPE sentiment_stage_memory_mb gauge" in lines
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import requests
+
+import sentiment
+from tests.helpers import StubClient, make_corpus
+
+
+def test_get_context_bow_matches_word_prefix(monkeypatch):
+    paragraphs = [
+        {"Barnevernet": 1, "hjalp": 1},
+        {"barnevern": 2, "svikter": 1},
+        {"skolen": 1, "er": 1},
+    ]
+    monkeypatch.setattr(sentiment, "fetch_paragraphs", lambda urn, use_cache=True: paragraphs)
+
+    context = sentiment.get_context_bow("URN:NBN:no-nb_digavis_test", "barnevern")
+    assert context["counts"].to_dict() == {"barnevern": 2, "barnevernet": 1, "hjalp": 1, "svikter": 1}
+
+    exact = sentiment.get_context_bow("URN:NBN:no-nb_digavis_test", "barnevern", exact=True)
+    assert exact["counts"].to_dict() == {"barnevern": 2, "svikter": 1}
+
+
+class MissingDocumentClient(StubClient):
+    """Answers 404 for the paragraphs of one document."""
+
+    missing = "URN:NBN:no-nb_digavis_synthetic_3"
+
+    def get(self, endpoint, params=None, use_cache=True):
+        if params["urn"] == self.missing:
+            raise requests.HTTPError(f"404 Client Error: Not Found for url: /{endpoint}")
+        return super().get(endpoint, params, use_cache)
+
+
+@pytest.mark.parametrize("stub_client", [MissingDocumentClient], indirect=True)
+def test_a_missing_document_has_no_paragraphs(stub_client):
+    urns = make_corpus(6).urn.tolist()
+    paragraphs = sentiment.ParagraphCounts.fetch(urns, use_cache=False)
+
+    per_document = np.bincount(paragraphs.documents, minlength=len(urns))
+    assert per_document[urns.index(MissingDocumentClient.missing)] == 0
+    assert (np.delete(per_document, urns.index(MissingDocumentClient.missing)) > 0).all()
+
+
+def test_token_ids():
+    counts = sentiment.TokenCounts.from_bags(
+        [{"barnevern": 1, "barnevernet": 2}, {"skolen": 1, "barn": 1}]
+    )
+    vocab = np.array(counts.vocab)
+    assert vocab[counts.token_ids("barnevern")].tolist() == ["barnevern"]
+    assert vocab[counts.token_ids("Barnevern")].tolist() == ["barnevern"]
+    assert sorted(vocab[counts.token_ids("barn*")]) == ["barn", "barnevern", "barnevernet"]
+    assert counts.token_ids("sykehus").tolist() == []
+    assert counts.rows_with("skolen").tolist() == [1]
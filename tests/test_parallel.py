@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import sentiment
+from tests.helpers import make_corpus
+
+
+@pytest.fixture
+def started_pools(monkeypatch):
+    """Count the process pools started by the pipeline."""
+    started = []
+
+    class CountingPool(ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            started.append(kwargs.get("initializer"))
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(sentiment, "ProcessPoolExecutor", CountingPool)
+    return started
+
+
+@pytest.mark.parametrize("return_token_counts", [False, True])
+def test_one_pool_per_run(stub_client, lexicon, started_pools, return_token_counts):
+    corpus = make_corpus(400)
+    options = dict(lexicon=lexicon, batch_size=100, chunksize=40, memo=sentiment.ScoreMemo())
+    parallel = sentiment.count_and_score_target_words(
+        corpus, "iskrem", workers=2, return_token_counts=return_token_counts, **options
+    )
+    assert started_pools == [sentiment._init_scoring_worker]
+
+    options["memo"] = sentiment.ScoreMemo()
+    serial = sentiment.count_and_score_target_words(
+        corpus, "iskrem", workers=1, return_token_counts=return_token_counts, **options
+    )
+    if return_token_counts:
+        (parallel, _), (serial, _) = parallel, serial
+    assert parallel.drop(columns="snippet", errors="ignore").equals(
+        serial.drop(columns="snippet", errors="ignore")
+    )
+
+
+def test_chunks_spread_over_all_workers():
+    texts = [str(i) for i in range(1000)]
+    assert len(sentiment.split_chunks(texts, workers=8, chunksize=2000)) == 8
+    assert len(sentiment.split_chunks(texts * 5, workers=8, chunksize=200)) == 25
+    assert len(sentiment.split_chunks(texts[:100], workers=8, chunksize=2000)) == 1
+    assert sum(sentiment.split_chunks(texts, workers=3, chunksize=2000), []) == texts
@@ -0,0 +1,17 @@
+import sentiment
+from tests.helpers import make_corpus
+
+
+def test_rescore_with_other_lexicons(stub_client, lexicon):
+    df, token_counts = sentiment.count_and_score_target_words(
+        make_corpus(100), "iskrem", lexicon=lexicon, return_token_counts=True
+    )
+    same = sentiment.rescore(df, token_counts, lexicon)
+    assert same[["positive", "negative"]].astype("int64").equals(
+        df[["positive", "negative"]].astype("int64")
+    )
+
+    swapped = sentiment.Lexicon(name="swapped", positive=lexicon.negative, negative=lexicon.positive)
+    compared = sentiment.compare_lexicons(df, token_counts, {"swapped": swapped})
+    assert compared.positive_swapped.tolist() == df.negative.tolist()
+    assert compared.sentimentscore_swapped.tolist() == (-df.sentimentscore).tolist()
@@ -0,0 +1,85 @@
+import math
+
+import pytest
+
+import sentiment
+from tests.helpers import StubClient, make_corpus
+
+
+def test_sampling_stops_when_the_intervals_are_narrow_enough(stub_client, lexicon):
+    corpus = make_corpus(400)
+    estimates, df = sentiment.sample_sentiment(
+        corpus, "iskrem", target_width=1e9, fraction=0.1, min_documents=5, lexicon=lexicon
+    )
+    sizes = corpus.groupby("year").size()
+    first_round = (sizes * 0.1).apply(math.ceil).clip(lower=5).clip(upper=sizes)
+    assert df.attrs["sample"]["rounds"] == [int(first_round.sum())]
+    assert df.attrs["sample"]["target_reached"]
+    assert estimates.documents.sum() == len(corpus)
+
+
+def test_sampling_grows_until_the_intervals_close(stub_client, lexicon):
+    corpus = make_corpus(200)
+    estimates, df = sentiment.sample_sentiment(
+        corpus, "iskrem", target_width=1e-9, fraction=0.05, min_documents=2, lexicon=lexicon
+    )
+    assert len(df.attrs["sample"]["rounds"]) > 1
+    assert df.attrs["sample"]["target_reached"]
+    assert (estimates.mean_high - estimates.mean_low).abs().max() <= 1e-9
+
+    complete = sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=lexicon)
+    scores = complete.groupby("dhlabid").sentimentscore.sum()
+    scores = scores.reindex(corpus.dhlabid, fill_value=0).groupby(corpus.year.to_numpy())
+    estimates = estimates.droplevel("word")
+    census = estimates[estimates.sampled == estimates.documents]
+    assert census["mean"].to_numpy() == pytest.approx(scores.mean()[census.index].to_numpy())
+    # a stratum stops short of a census only when its sampled scores are all alike
+    sampled = df.groupby("dhlabid").sentimentscore.sum()
+    for year in estimates.index.difference(census.index):
+        docids = corpus.dhlabid[corpus.year == year]
+        assert sampled.reindex(docids).dropna().nunique() <= 1
+
+
+@pytest.mark.parametrize(
+    "argument",
+    [
+        {"growth": 1},
+        {"growth": 0.5},
+        {"fraction": 0},
+        {"fraction": 1.5},
+        {"min_documents": -1},
+        {"target_width": 0},
+        {"target_width": -1},
+    ],
+)
+def test_sampling_rejects_arguments_that_never_finish(stub_client, lexicon, argument):
+    with pytest.raises(ValueError, match=next(iter(argument))):
+        sentiment.compute_sentiment_analysis(
+            make_corpus(20), "iskrem", **{"target_width": 1.0, **argument}, lexicon=lexicon
+        )
+
+
+class NoHitsClient(StubClient):
+    """Finds no frequencies for the keywords, or no concordances with ``endpoint="conc"``."""
+
+    endpoint = "frequencies"
+
+    def post(self, endpoint, json=None, use_cache=True):
+        return [] if endpoint == self.endpoint else super().post(endpoint, json, use_cache)
+
+
+class NoConcordancesClient(NoHitsClient):
+    endpoint = "conc"
+
+
+@pytest.mark.parametrize("stub_client", [NoHitsClient, NoConcordancesClient], indirect=True)
+def test_sampling_a_word_without_hits(stub_client, lexicon):
+    corpus = make_corpus(60)
+    estimates, df = sentiment.compute_sentiment_analysis(
+        corpus, "iskrem", target_width=1.0, lexicon=lexicon, use_cache=False
+    )
+    assert df.empty
+    assert list(df.columns) == sentiment.result_columns(corpus.columns)
+    assert estimates.documents.sum() == len(corpus)
+    assert (estimates["mean"] == 0).all()
+    assert df.attrs["sample"]["target_reached"]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import sentiment
+from tests.helpers import StubClient, make_corpus, make_snippet, make_snippets
+
+
+class WindowClient(StubClient):
+    """Answers ``/conc`` with ``window`` tokens on either side of the keyword."""
+
+    def post(self, endpoint, json=None, use_cache=True):
+        if endpoint != "conc":
+            return super().post(endpoint, json, use_cache)
+        rows = []
+        for urn in json["urns"]:
+            docid, rng, n = self._doc(urn)
+            snippets = [make_snippet(rng, json["query"], 2 * json["window"]) for _ in range(n)]
+            rows += [{"docid": docid, "urn": urn, "conc": conc} for conc in snippets]
+        return rows[: json["limit"]]
+
+
+def test_count_windows_around_the_keyword():
+    lexicon = sentiment.Lexicon(
+        name="windows", positive=frozenset(["glad", "fin"]), negative=frozenset(["trist"])
+    )
+    text = "glad og trist <b>iskrem</b> er fin , glad"
+    counts = lexicon.matcher.count_windows(text, [0, 1, 2, 4, 100])
+    # the window counts tokens on either side of the keyword: iskrem | trist, er | og, fin | ...
+    assert counts.tolist() == [[0, 0], [0, 1], [1, 1], [3, 1], [3, 1]]
+    assert counts[-1].tolist() == list(lexicon.matcher.count(text))
+
+
+def test_score_windows_columns(lexicon):
+    texts = make_snippets(20)
+    df = sentiment.score_windows(texts, [5, 10], lexicon)
+    assert list(df.columns) == ["positive_w5", "negative_w5", "positive_w10", "negative_w10"]
+    assert np.all(df.positive_w5 <= df.positive_w10)
+    assert np.all(df.negative_w5 <= df.negative_w10)
+
+
+def test_windows_are_derived_from_one_fetch(stub_client, lexicon):
+    df = sentiment.count_and_score_target_words(
+        make_corpus(50), "iskrem", lexicon=lexicon, windows=[2, 5]
+    )
+    assert (df.positive_w2 <= df.positive_w5).all()
+    assert (df.positive_w5 <= df.positive).all()
+    assert df.sentimentscore_w5.equals(df.positive_w5 - df.negative_w5)
+
+
+@pytest.mark.parametrize("stub_client", [WindowClient], indirect=True)
+def test_main_scores_keep_the_concordance_window(stub_client, lexicon):
+    corpus = make_corpus(50)
+    swept = sentiment.count_and_score_target_words(
+        corpus, "iskrem", lexicon=lexicon, window=10, windows=[3, 10]
+    )
+    single = sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=lexicon, window=10)
+    wide = sentiment.count_and_score_target_words(corpus, "iskrem", lexicon=lexicon, window=50)
+
+    assert swept.positive.tolist() == single.positive.tolist()
+    assert swept.positive_w10.tolist() == single.positive.tolist()
+    assert swept.negative_w10.tolist() == single.negative.tolist()
+    assert wide.positive.sum() > single.positive.sum()
+
+
+def test_windows_larger_than_the_window_are_refused(tmp_path, stub_client, lexicon):
+    corpus = make_corpus(10)
+    with pytest.raises(ValueError, match="larger than the concordance window 10"):
+        sentiment.count_and_score_target_words(
+            corpus, "iskrem", lexicon=lexicon, window=10, windows=[5, 50]
+        )
+    with pytest.raises(ValueError, match="larger than the concordance window 10"):
+        sentiment.count_and_score_target_words(
+            corpus, "iskrem", lexicon=lexicon, window=10, windows=[50], checkpoint_dir=tmp_path
+        )
+    assert not any(tmp_path.iterdir())
+    with pytest.raises(SystemExit):
+        sentiment.parse_args(["iskrem", "-o", "out.csv", "--window", "25", "--windows", "50"])